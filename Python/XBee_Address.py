@@ -0,0 +1,130 @@
+"""
+64 bit to 16 bit address table for ZigBee (series 2) meshes.
+
+A ZigBee node keeps its 64 bit address for life, but its 16 bit network
+  address is assigned when it joins and can change.  A transmit request to
+  a 64 bit address with the 16 bit address unknown (0xFFFE) makes the mesh
+  discover it first, at the cost of a broadcast, so the series 2 drivers
+  learn every mapping they see: the source of each received packet (0x90)
+  and remote AT response (0x97), and every node listed by node discovery.
+  Send() then fills in the 16 bit address itself.
+
+To learn the whole mesh at once, send node discovery, e.g.
+  xbee.SendAT(b'ND'); every node's response is learned as it arrives.
+"""
+import struct
+import threading
+from collections import OrderedDict
+from time import time
+from XBee_Protocol import USE_64
+
+# Received packets and remote AT responses, which carry both addresses
+SOURCES = (0x90, 0x97)
+AT_RESPONSE = 0x88
+# Start of a node discovery response: MY, SH, SL
+NODE = struct.Struct('>HII')
+
+
+class AddressTable():
+    """
+    Maps 64 bit addresses to 16 bit network addresses, forgetting entries
+      not seen for `ttl` seconds.  Safe to share between threads.
+
+    Counters:
+      hits: Lookups answered from the table
+      misses: Lookups of addresses not in the table
+      learned: Mappings added or changed
+      expired: Mappings forgotten for age or to stay within `limit`
+    """
+
+    def __init__(self, ttl=600.0, limit=1024):
+        """
+        Inputs:
+          ttl: Seconds a mapping is kept after it was last seen
+          limit: Most mappings kept; the least recently seen goes first
+        """
+        self.ttl = ttl
+        self.limit = limit
+        # addr64: (expiry time, addr16), least recently seen first
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.learned = 0
+        self.expired = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def Add(self, addr64, addr16, now=None):
+        """
+        Records that `addr64` currently has network address `addr16`.
+        """
+        now = time() if now is None else now
+        with self.lock:
+            entry = self.entries.pop(addr64, None)
+            if entry is None or entry[1] != addr16:
+                self.learned += 1
+            self.entries[addr64] = (now + self.ttl, addr16)
+            self.Expire(now)
+
+    def Learn(self, frame):
+        """
+        Learns the addresses a received frame reveals, if any.
+
+        Inputs:
+          frame: An XBee_Frames object
+        """
+        api = frame.api_id
+        if api in SOURCES:
+            if frame.source16 != USE_64:
+                self.Add(frame.source, frame.source16)
+        elif api == AT_RESPONSE and frame.command == b'ND':
+            payload = frame.payload
+            if frame.status == 0 and len(payload) >= NODE.size:
+                addr16, high, low = NODE.unpack_from(payload)
+                self.Add((high << 32) | low, addr16)
+
+    def Lookup(self, addr64, now=None):
+        """
+        Outputs:
+          The 16 bit network address of `addr64`, or 0xFFFE if it isn't
+            known, which makes the mesh discover it
+        """
+        now = time() if now is None else now
+        with self.lock:
+            entry = self.entries.get(addr64)
+            if entry is None or entry[0] <= now:
+                self.misses += 1
+                return USE_64
+            self.hits += 1
+            return entry[1]
+
+    def Forget(self, addr64):
+        """
+        Drops a mapping, e.g. after a transmit to its network address
+          failed.
+        """
+        with self.lock:
+            self.entries.pop(addr64, None)
+
+    def Expire(self, now=None):
+        """
+        Drops mappings that have aged out, then the least recently seen
+          ones until there are at most `limit`.  Called with the lock held.
+
+        Outputs:
+          Number of mappings dropped
+        """
+        now = time() if now is None else now
+        entries = self.entries
+        dropped = 0
+        # Entries are kept in the order they were last seen, so the
+        #  oldest, and first to expire, are at the front
+        while entries and (len(entries) > self.limit or
+                           next(iter(entries.values()))[0] <= now):
+            entries.popitem(last=False)
+            dropped += 1
+        self.expired += dropped
+        return dropped
@@ -0,0 +1,308 @@
+import asyncio
+import os
+import serial
+import XBee_Core
+import XBee_Protocol
+
+
+class XBee(XBee_Core.Core, asyncio.Protocol):
+    """
+    asyncio driver for an XBee.  Frame handling is shared with the other
+      drivers in XBee_Core; sends are coroutines here.
+
+    The serial port's file descriptor is watched with loop.add_reader, so
+      received bytes are decoded as soon as they arrive, without a reader
+      thread or polling.  Writes that don't fit in the port's buffer are
+      finished by loop.add_writer.  Needs a port with a selectable file
+      descriptor, i.e. a POSIX serial device or pty.
+
+    Must be created from a coroutine running in the event loop it will use.
+    """
+
+    def __init__(self, serialport, baudrate=9600, trace=None, family=None,
+                 metrics=None):
+        """
+        Inputs:
+          serialport: Name of the serial port the XBee is attached to
+          baudrate: Optional serial baud rate (default 9600)
+          trace: Optional XBee_Trace object that records every frame
+            sent and received (default: no tracing)
+          family: Optional XBee_Protocol family name
+            (default: XBee_Protocol.SERIES1)
+          metrics: Optional XBee_Metrics.Metrics object
+            (default: no metrics)
+        """
+        XBee_Core.Core.__init__(self, trace, family, metrics)
+        self.loop = asyncio.get_running_loop()
+        self.serial = serial.Serial(port=serialport, baudrate=baudrate,
+                                    timeout=0)
+        self.fd = self.serial.fileno()
+        self.RxQ = asyncio.Queue()
+        self.txbuff = bytearray()
+        self.drained = None
+        self.closed = False
+        self.loop.add_reader(self.fd, self.Readable)
+
+    def shutdown(self):
+        """
+        Stops watching the serial port and closes it.  Pending Receive()
+          calls and iterators return None/stop.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        self.loop.remove_reader(self.fd)
+        self.loop.remove_writer(self.fd)
+        self.serial.close()
+        if self.drained and not self.drained.done():
+            self.drained.set_exception(ConnectionError("Port closed"))
+        self.RxQ.put_nowait(None)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.shutdown()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        frame = await self.Receive()
+        if frame is None:
+            raise StopAsyncIteration
+        return frame
+
+    def Readable(self):
+        """
+        Called by the event loop when the serial port has bytes waiting.
+        """
+        try:
+            chunk = os.read(self.fd, 4096)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as exc:
+            self.connection_lost(exc)
+            return
+        if chunk:
+            self.data_received(chunk)
+
+    def data_received(self, data):
+        self.Received(data)
+
+    def Deliver(self, frame):
+        if self.metrics:
+            self.metrics.Queued()
+        self.RxQ.put_nowait(frame)
+
+    def connection_lost(self, exc):
+        self.shutdown()
+
+    async def Receive(self, wait=None):
+        """
+        Waits for the next received message
+
+        Inputs:
+          wait: Optional number of seconds to wait for a message
+            (default: wait until one arrives or the port is closed)
+        Output:
+          Message, if received, as an XBee_Frames object for its
+          API type.  None if timed out or closed.
+        """
+        if self.closed and self.RxQ.empty():
+            return None
+        try:
+            frame = await asyncio.wait_for(self.RxQ.get(), wait)
+        except asyncio.TimeoutError:
+            return None
+
+        if frame is None:
+            # Leave the end marker for any other waiting consumers
+            self.RxQ.put_nowait(None)
+        elif self.metrics:
+            self.metrics.Dequeued()
+        return frame
+
+    async def SendStr(self, msg, addr=None, options=0x01, frameid=0x00):
+        """
+        Inputs:
+          msg: A message, in string format, to be sent
+          addr: The 16 bit address of the destination XBee, or its 64 bit
+            address if above 0xFFFF
+            (default: broadcast)
+          options: Optional byte to specify transmission options
+            (default 0x01: disable acknowledge)
+          frameid: Optional frameid, only used if Tx status is desired
+        Returns:
+          Number of bytes sent
+        """
+        return await self.Send(msg.encode('utf-8'), addr, options, frameid)
+
+    async def Send(self, msg, addr=None, options=0x01, frameid=0x00):
+        """
+        Inputs:
+          msg: A message, in bytes or bytearray format, to be sent to an XBee
+          addr: The 16 bit address of the destination XBee, or its 64 bit
+            address if above 0xFFFF
+            (default broadcast)
+          options: Optional byte to specify transmission options
+            (default 0x01: disable ACK)
+          frameid: Optional frameid, only used if transmit status is desired
+        Returns:
+          Number of bytes sent, once they have been handed to the port
+        """
+        sent = XBee_Core.Core.Send(self, msg, addr, options, frameid)
+        await self.Drain()
+        return sent
+
+    async def SendMany(self, msgs, options=0x01, frameid=0x00):
+        """
+        Builds a batch of messages into one buffer and writes it at once.
+
+        Inputs:
+          msgs: An iterable of (addr, msg) tuples, where addr is the 16 bit
+            address of the destination XBee and msg is in bytes or
+            bytearray format
+          options: Optional byte to specify transmission options
+            (default 0x01: disable ACK)
+          frameid: Optional frameid, only used if transmit status is desired
+        Returns:
+          Number of bytes sent, once they have been handed to the port
+        """
+        sent = XBee_Core.Core.SendMany(self, msgs, options, frameid)
+        await self.Drain()
+        return sent
+
+    async def SendTracked(self, msg, addr=None, options=0x01, timeout=5.0):
+        """
+        Sends a message with a frame ID allocated from the tracker and
+          waits for the XBee to report whether it was delivered.
+
+        Inputs:
+          msg: A message, in bytes or bytearray format, to be sent to an XBee
+          addr: The 16 bit address of the destination XBee, or its 64 bit
+            address if above 0xFFFF
+          options: Optional byte to specify transmission options
+          timeout: Number of seconds to wait for the transmit status
+        Returns:
+          The transmit status frame (XBee_Frames.TxStatus or
+          ZigBeeTxStatus).  Raises asyncio.TimeoutError if none arrives
+          in time.
+        """
+        frameid, future = self.tracker.Allocate(timeout)
+        try:
+            await self.Send(msg, addr, options, frameid)
+            return await asyncio.wait_for(asyncio.wrap_future(future),
+                                          timeout)
+        finally:
+            self.tracker.Release(frameid)
+
+    async def SendAT(self, command, parameter=b'', queue=False, timeout=5.0):
+        """
+        Sends an AT command to the local XBee and waits for the response.
+
+        Inputs:
+          command: Two letter command, in bytes format, e.g. b'MY'
+          parameter: Optional value to set (default: read the parameter)
+          queue: Optional; if True the change waits for an AC or WR command
+          timeout: Number of seconds to wait for the response
+        Returns:
+          The XBee_Frames.ATResponse.  Raises asyncio.TimeoutError if none
+          arrives in time.
+        """
+        encode = XBee_Protocol.ATQueue if queue else XBee_Protocol.ATCommand
+        return await self.Wait(self.Request(encode, parameter, timeout,
+                                            command=command), timeout)
+
+    async def SendRemoteAT(self, command, addr=None, addr64=None,
+                           parameter=b'', options=0x02, timeout=5.0):
+        """
+        Sends an AT command over the air to another XBee and waits for the
+          response.
+
+        Inputs:
+          As for XBee_Core.Core.SendRemoteAT
+        Returns:
+          The XBee_Frames.RemoteATResponse.  Raises asyncio.TimeoutError if
+          none arrives in time.
+        """
+        if addr64 is None:
+            addr64 = XBee_Protocol.UNKNOWN
+            if addr is None:
+                raise ValueError("A remote AT command needs an address")
+        else:
+            addr = XBee_Protocol.USE_64
+        return await self.Wait(self.Request(
+            XBee_Protocol.RemoteAT, parameter, timeout, command=command,
+            addr=addr, addr64=addr64, options=options), timeout)
+
+    async def Wait(self, request, timeout):
+        """
+        Waits for the response to a frame sent by Request().
+        """
+        frameid, future = request
+        try:
+            await self.Drain()
+            return await asyncio.wait_for(asyncio.wrap_future(future),
+                                          timeout)
+        finally:
+            self.tracker.Release(frameid)
+
+    def Batch(self, window=0.002, budget=256, latency=0.01):
+        """
+        Not needed here: frames sent while the port is busy are already
+          coalesced into one write by Writable().
+        """
+        raise NotImplementedError("Batching is built into the asyncio driver")
+
+    def Write(self, frame):
+        """
+        Writes as much of a frame as the port accepts right away and leaves
+          the rest to be written when the port is writable again.
+
+        Returns:
+          Number of bytes written or queued
+        """
+        if self.closed:
+            raise ConnectionError("Port closed")
+
+        if not self.txbuff:
+            try:
+                written = os.write(self.fd, frame)
+            except (BlockingIOError, InterruptedError):
+                written = 0
+            if written == len(frame):
+                return written
+            self.loop.add_writer(self.fd, self.Writable)
+        else:
+            written = 0
+        self.txbuff.extend(frame[written:])
+        return len(frame)
+
+    def Writable(self):
+        """
+        Called by the event loop when the port can accept more bytes.
+        """
+        try:
+            written = os.write(self.fd, self.txbuff)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as exc:
+            self.connection_lost(exc)
+            return
+
+        del self.txbuff[:written]
+        if not self.txbuff:
+            self.loop.remove_writer(self.fd)
+            if self.drained and not self.drained.done():
+                self.drained.set_result(None)
+
+    async def Drain(self):
+        """
+        Waits until every queued byte has been handed to the port.
+        """
+        if not self.txbuff:
+            return
+        if self.drained is None or self.drained.done():
+            self.drained = self.loop.create_future()
+        await self.drained
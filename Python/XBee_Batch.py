@@ -0,0 +1,263 @@
+"""
+Decodes whole captured buffers at once with NumPy, for offline analysis of
+  streams far too large to push through Receive() one chunk at a time.
+
+decode_buffer() finds every start delimiter, reads the length fields and
+  verifies checksums with array operations over frames that contain no
+  escaped bytes, which is most of them.  Only frames with escapes go
+  through the scalar Decoder.  Instead of an object per frame it returns a
+  FrameTable: one NumPy array per field.
+
+Needs NumPy; the rest of the package doesn't.
+"""
+from XBee_Decoder import Decoder
+import XBee_Protocol
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Bytes of the buffer handled per pass, bounding the memory used
+BLOCK = 1 << 24
+# Longest possible frame on the wire, every byte after the delimiter escaped
+LONGEST = 2 * (0xFFFF + 3) + 1
+
+WIDTHS = {'B': 1, 'H': 2, 'Q': 8}
+LAYOUTS = dict((layout.api, layout) for layout in XBee_Protocol.LAYOUTS)
+# Fields read into columns: {api: [(column in a Scalar() row, offset,
+#  width)]}
+FIELDS = dict((api, [(('source', 'rssi', 'options').index(name) + 1, offset,
+                      WIDTHS[code])
+                     for name, (offset, code) in layout.offsets.items()
+                     if name in ('source', 'rssi', 'options')])
+              for api, layout in LAYOUTS.items())
+COLUMNS = (
+    ('offset', 'int64'),    # Position of the start delimiter in the buffer
+    ('api', 'uint8'),       # API identifier
+    ('source', 'uint64'),   # Source address of receive packets, else 0
+    ('rssi', 'int16'),      # RSSI, -1 if the frame type has none
+    ('options', 'int16'),   # Options byte, -1 if the frame type has none
+    ('payload', 'int64'),   # Where the payload starts
+    ('length', 'int32'),    # Payload bytes
+    ('escaped', 'bool'),    # Payload is in `unescaped`, not the buffer
+)
+
+
+class FrameTable():
+    """
+    Columns of every valid frame in a buffer, in buffer order.  Frames of
+      a type without a known layout have everything after the API
+      identifier as their payload; status frames have none.
+
+    Counters:
+      checksums: Frames with a bad checksum or escape sequence
+      lengths: Frames cut short by the next start delimiter or the end of
+        the buffer
+    """
+
+    def __init__(self, buffer, columns, unescaped, checksums, lengths):
+        self.buffer = buffer
+        for name, _ in COLUMNS:
+            setattr(self, name, columns[name])
+        self.unescaped = unescaped
+        self.checksums = checksums
+        self.lengths = lengths
+
+    def __len__(self):
+        return len(self.offset)
+
+    def Payload(self, index):
+        """
+        Outputs:
+          A memoryview of one frame's payload
+        """
+        start = int(self.payload[index])
+        end = start + int(self.length[index])
+        source = self.unescaped if self.escaped[index] else self.buffer
+        return memoryview(source)[start:end]
+
+
+def Read(data, at, width):
+    """ Reads big-endian unsigned fields of `width` bytes at every `at` """
+    value = numpy.zeros(len(at), dtype=numpy.uint64)
+    for k in range(width):
+        value = (value << numpy.uint64(8)) | data[at + k].astype(numpy.uint64)
+    return value
+
+
+def Empty(count=0):
+    return dict((name, numpy.zeros(count, dtype=dtype))
+                for name, dtype in COLUMNS)
+
+
+def Fields(data, starts, lengths, columns):
+    """
+    Fills in the columns of clean frames from their layouts.
+
+    Inputs:
+      data: The block being decoded
+      starts: Block offsets of the frames' start delimiters
+      lengths: The frames' length fields
+      columns: Columns for these frames, with `api` already set
+    """
+    columns['rssi'][:] = -1
+    columns['options'][:] = -1
+    columns['payload'][:] = starts + 4
+    columns['length'][:] = lengths - 1
+
+    for api in numpy.unique(columns['api']):
+        layout = LAYOUTS.get(int(api))
+        if layout is None:
+            continue
+        # Fields are only there if the frame is long enough to hold them
+        mask = (columns['api'] == api) & (lengths >= layout.end - 2)
+        at = starts[mask] + 1
+        for name, (offset, code) in layout.offsets.items():
+            if name in ('source', 'rssi', 'options'):
+                column = columns[name]
+                column[mask] = Read(data, at + offset, WIDTHS[code])
+        columns['payload'][mask] = at + layout.end
+        if layout.payload:
+            columns['length'][mask] = lengths[mask] + 2 - layout.end
+        else:
+            columns['length'][mask] = 0
+
+
+def Scalar(frame, unescaped):
+    """
+    Reads the fields of an unescaped frame, as returned by the Decoder,
+      storing its payload in `unescaped`.
+
+    Outputs:
+      (api, source, rssi, options, payload, length)
+    """
+    api = frame[2]
+    row = [api, 0, -1, -1]
+    start, end = 3, len(frame) - 1
+
+    layout = LAYOUTS.get(api)
+    if layout is not None and len(frame) >= layout.end + 1:
+        for column, offset, width in FIELDS[api]:
+            row[column] = int.from_bytes(frame[offset:offset + width], 'big')
+        start = layout.end
+        if not layout.payload:
+            end = start
+
+    row.append(len(unescaped))
+    row.append(end - start)
+    unescaped += frame[start:end]
+    return row
+
+
+def Block(data, base, limit, unescaped):
+    """
+    Decodes the frames starting in data[:limit].
+
+    Inputs:
+      data: A uint8 array: the block, plus enough of what follows for
+        a frame starting in it to be complete
+      base: Offset of the block in the whole buffer
+      limit: Frames starting at or after this are left to the next block
+      unescaped: Where the payloads of frames with escapes are stored
+
+    Outputs:
+      The block's columns, and its checksum and length error counts
+    """
+    end = len(data)
+    delimiters = numpy.flatnonzero(data == 0x7E)
+    starts = delimiters[delimiters < limit]
+    if not len(starts):
+        return Empty(), 0, 0
+    # A start delimiter is never escaped, so each frame runs at most to
+    #  the next one
+    nexts = numpy.append(delimiters, end)[numpy.searchsorted(
+        delimiters, starts, side='right')]
+
+    # Frames without room for a length field are cut short
+    header = starts + 3 <= nexts
+    lengths = int(numpy.count_nonzero(~header))
+    starts, nexts = starts[header], nexts[header]
+
+    msb, lsb = data[starts + 1], data[starts + 2]
+    sizes = (msb.astype(numpy.int64) << 8) | lsb
+    stops = starts + sizes + 4
+
+    # Frames with an escape marker before their end go to the Decoder
+    markers = numpy.flatnonzero(data == 0x7D)
+    first = numpy.append(markers, end)[numpy.searchsorted(markers, starts)]
+    escaped = first < numpy.minimum(stops, nexts)
+    escaped |= (msb == 0x7D) | (lsb == 0x7D)
+
+    short = ~escaped & (stops > nexts)
+    lengths += int(numpy.count_nonzero(short))
+    clean = ~escaped & ~short
+
+    # Checksums from a running sum that wraps at 256, as the checksum does
+    sums = numpy.cumsum(data, dtype=numpy.uint8)
+    good = numpy.zeros(len(starts), dtype=bool)
+    good[clean] = (sums[stops[clean] - 1] - sums[starts[clean] + 2]) == 0xFF
+    checksums = int(numpy.count_nonzero(clean & ~good))
+
+    found = starts[good]
+    columns = Empty(len(found))
+    columns['api'][:] = data[found + 3]
+    Fields(data, found, sizes[good], columns)
+    columns['offset'][:] = found + base
+    columns['payload'][:] += base
+
+    rest = numpy.flatnonzero(escaped)
+    if len(rest):
+        rows = []
+        decoder = Decoder()
+        for start, stop in zip(starts[rest].tolist(), nexts[rest].tolist()):
+            frames = decoder.Feed(data[start:stop].tobytes())
+            decoder.Reset()
+            if frames:
+                rows.append([start + base] + Scalar(frames[0], unescaped))
+        checksums += decoder.checksums
+        # The rest were still waiting for bytes when the next frame began
+        lengths += len(rest) - len(rows) - decoder.checksums
+        if rows:
+            values = list(zip(*rows)) + [(True,) * len(rows)]
+            for (name, dtype), value in zip(COLUMNS, values):
+                columns[name] = numpy.concatenate(
+                    (columns[name], numpy.array(value, dtype=dtype)))
+
+    return columns, checksums, lengths
+
+
+def decode_buffer(buf, block=BLOCK):
+    """
+    Decodes every frame in a buffer of raw serial data.
+
+    Inputs:
+      buf: bytes, bytearray, mmap or anything else exposing a buffer
+      block: Bytes handled per pass
+
+    Outputs:
+      A FrameTable
+    """
+    if numpy is None:
+        raise ImportError("decode_buffer() needs NumPy")
+
+    data = numpy.frombuffer(buf, dtype=numpy.uint8)
+    parts = []
+    unescaped = bytearray()
+    checksums = lengths = 0
+    for base in range(0, len(data), block):
+        limit = min(block, len(data) - base)
+        stop = min(base + block + LONGEST, len(data))
+        columns, bad, short = Block(data[base:stop], base, limit,
+                                    unescaped)
+        parts.append(columns)
+        checksums += bad
+        lengths += short
+
+    if parts:
+        columns = dict((name, numpy.concatenate([p[name] for p in parts]))
+                       for name, _ in COLUMNS)
+        order = numpy.argsort(columns['offset'], kind='stable')
+        columns = dict((name, c[order]) for name, c in columns.items())
+    else:
+        columns = Empty()
+    return FrameTable(buf, columns, unescaped, checksums, lengths)
@@ -0,0 +1,115 @@
+"""
+Finds the baud rate an XBee's UART is set to and switches both ends to a
+  faster one.
+
+At 9600 baud a 100 byte frame spends over 100ms on the serial line, so the
+  line, not the radio, limits throughput.  Negotiate() finds the module's
+  current rate by asking for ATBD at each rate until it answers, sets the
+  new rate with ATBD and applies it with ATAC, switches the host port to
+  match and checks that the module answers there.  If any step fails it
+  goes back to a rate the module answers at, so the driver is never left
+  unable to talk to it.
+
+The new rate isn't written to the module's flash unless asked, so a power
+  cycle brings it back to the rate it was configured with.
+
+Works with the polling and threaded drivers.
+"""
+from concurrent.futures import TimeoutError
+from XBee_Parameters import ATError, LOCAL, Parameters
+
+# Baud rates by ATBD value
+RATES = (1200, 2400, 4800, 9600, 19200, 38400, 57600, 115200, 230400)
+
+
+def Switch(driver, rate):
+    """
+    Sets the host port's baud rate and drops whatever was received at the
+      old one.
+    """
+    driver.serial.baudrate = rate
+    driver.Discard()
+
+
+def Probe(driver, rate, timeout=0.5):
+    """
+    Switches the host port to `rate` and checks whether the XBee answers.
+
+    Outputs:
+      True if it answered ATBD
+    """
+    Switch(driver, rate)
+    parameters = Parameters(driver, ttl=0, timeout=timeout)
+    try:
+        parameters.Read(b'BD')
+    except (ATError, TimeoutError):
+        return False
+    return True
+
+
+def Detect(driver, rates=RATES, timeout=0.5):
+    """
+    Finds the rate the XBee's UART is set to, trying the host port's
+      current rate first, then the others from fastest to slowest.
+
+    Outputs:
+      The rate, with the host port left set to it, or None with the port
+        left as it was
+    """
+    current = driver.serial.baudrate
+    for rate in [current] + sorted(set(rates) - set([current]), reverse=True):
+        if Probe(driver, rate, timeout):
+            return rate
+    Switch(driver, current)
+    return None
+
+
+def Command(parameters, command):
+    """ Runs a local AT command that takes no parameter and waits for it """
+    future = parameters.Command(LOCAL, command)
+    parameters.Wait([future])
+    return future.result()
+
+
+def Negotiate(driver, rate=115200, timeout=0.5, write=False):
+    """
+    Switches the XBee and the host port to a new baud rate.
+
+    Inputs:
+      driver: A polling or threaded XBee driver
+      rate: The rate to switch to, one of RATES
+      timeout: Seconds to wait for each response
+      write: Optional; if True the new rate is also written to flash
+        with ATWR, which raises ATError or TimeoutError if that fails
+
+    Outputs:
+      The rate both ends are now set to: `rate` if it worked, otherwise
+        the rate the module answers at, or None if it answers at none
+    """
+    if rate not in RATES:
+        raise ValueError("Baud rate must be one of {}".format(RATES))
+    current = Detect(driver, timeout=timeout)
+    if current is None or current == rate:
+        return current
+
+    parameters = Parameters(driver, ttl=0, timeout=timeout)
+    try:
+        parameters.Write(b'BD', bytearray((RATES.index(rate),)))
+        # The module answers at the old rate, then switches
+        Command(parameters, b'AC')
+    except (ATError, TimeoutError):
+        # The module may have switched without its response getting back
+        pass
+
+    if Probe(driver, rate, timeout):
+        if write:
+            Command(parameters, b'WR')
+        return rate
+    if Probe(driver, current, timeout):
+        # Undo the new setting, so a later ATAC doesn't switch
+        try:
+            parameters.Write(b'BD', bytearray((RATES.index(current),)))
+        except (ATError, TimeoutError):
+            pass
+        return current
+    return Detect(driver, timeout=timeout)
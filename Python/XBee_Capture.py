@@ -0,0 +1,202 @@
+"""
+Raw serial captures, for reproducing field problems and benchmarking the
+  decoder offline against real traffic.
+
+A Recorder attached to a driver (driver.Capture(recorder)) appends every
+  chunk read from serial, exactly as read, with a monotonic timestamp.  A
+  Replay memory-maps the file and feeds the chunks through a decoder or a
+  driver's receive path, as fast as possible or at the pace they were
+  recorded.
+
+File format:
+  Header: 'XBCP', version (1 byte), wall clock time at the start (double)
+  Records: microseconds since the start (64 bits), length (16 bits), data
+  All big-endian.
+
+Usage:
+  python XBee_Capture.py capture.xbc
+    Decodes a capture as fast as possible and prints what it held
+"""
+import mmap
+import struct
+import sys
+import threading
+from time import perf_counter, sleep, time
+from XBee_Decoder import Decoder
+
+MAGIC = b'XBCP'
+VERSION = 1
+HEADER = struct.Struct('>4sBd')
+RECORD = struct.Struct('>QH')
+# Longest chunk in one record; longer reads are split
+LONGEST = 0xFFFF
+
+
+class Recorder():
+    """
+    Writes a capture file.  Safe to share between threads.
+    """
+
+    def __init__(self, path):
+        """
+        Inputs:
+          path: File to create, replacing any file already there
+        """
+        self.file = open(path, 'wb')
+        self.file.write(HEADER.pack(MAGIC, VERSION, time()))
+        self.start = perf_counter()
+        self.lock = threading.Lock()
+        self.chunks = 0
+        self.bytes = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def Write(self, chunk):
+        """
+        Appends a chunk read from serial, stamped with the current time.
+        """
+        stamp = int((perf_counter() - self.start) * 1e6)
+        with self.lock:
+            for i in range(0, len(chunk), LONGEST):
+                piece = chunk[i:i + LONGEST]
+                self.file.write(RECORD.pack(stamp, len(piece)))
+                self.file.write(piece)
+            self.chunks += 1
+            self.bytes += len(chunk)
+
+    def flush(self):
+        with self.lock:
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            if not self.file.closed:
+                self.file.close()
+
+
+class Replay():
+    """
+    A capture file, memory-mapped for reading.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.map) < HEADER.size:
+            raise ValueError("Not a capture file: {}".format(path))
+        magic, version, self.started = HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Not a version {} capture file: {}".format(
+                VERSION, path))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.map.close()
+
+    def __iter__(self):
+        """
+        Yields (seconds since the start, chunk) for every record.  A record
+          cut short, as when the recorder was killed mid-write, ends the
+          capture.
+        """
+        for _, stamp, chunk in self.Records():
+            yield stamp, chunk
+
+    def Records(self, pos=HEADER.size):
+        """
+        Yields (file offset, seconds since the start, chunk) for every
+          record from the one at `pos` on.
+        """
+        data = self.map
+        end = len(data)
+        while pos + RECORD.size <= end:
+            stamp, length = RECORD.unpack_from(data, pos)
+            start = pos + RECORD.size
+            if start + length > end:
+                return
+            yield pos, stamp / 1e6, data[start:start + length]
+            pos = start + length
+
+    def Chunks(self, speed=None):
+        """
+        Yields every chunk, paced as recorded if `speed` is set.
+
+        Inputs:
+          speed: Optional replay speed: 1 for the pace the chunks were read
+            at, 2 for twice as fast, etc. (default: as fast as possible)
+        """
+        if not speed:
+            for _, chunk in self:
+                yield chunk
+            return
+
+        start = perf_counter()
+        for stamp, chunk in self:
+            delay = start + stamp / speed - perf_counter()
+            if delay > 0:
+                sleep(delay)
+            yield chunk
+
+    def Frames(self, decoder=None, speed=None):
+        """
+        Yields every frame decoded from the capture.
+
+        Inputs:
+          decoder: Optional Decoder to use, e.g. to read its counters after
+            (default: a new Decoder)
+          speed: As for Chunks()
+        """
+        decoder = Decoder() if decoder is None else decoder
+        for chunk in self.Chunks(speed):
+            for frame in decoder.Feed(chunk):
+                yield frame
+
+    def Play(self, driver, speed=None):
+        """
+        Feeds the capture into a driver's receive path, exactly as if it
+          had been read from serial: decoding, parsing, tracing, metrics
+          and queueing all happen as they would live.
+
+        Inputs:
+          driver: An XBee driver
+          speed: As for Chunks()
+
+        Outputs:
+          Number of chunks fed
+        """
+        count = 0
+        for chunk in self.Chunks(speed):
+            driver.Received(chunk)
+            count += 1
+        return count
+
+
+if __name__ == "__main__":
+    with Replay(sys.argv[1]) as capture:
+        records = list(capture)
+        if not records:
+            print("Empty capture")
+            sys.exit()
+        size = sum(len(chunk) for _, chunk in records)
+
+        decoder = Decoder()
+        start = perf_counter()
+        frames = sum(1 for _ in capture.Frames(decoder))
+        elapsed = perf_counter() - start
+
+        print("{} chunks, {} bytes over {:.3f}s".format(
+            len(records), size, records[-1][0]))
+        print("{} frames, {} checksum errors, {} length errors, "
+              "{} bytes discarded".format(frames, decoder.checksums,
+                                          decoder.lengths, decoder.discarded))
+        print("Decoded in {:.3f}s: {:.2f} MB/s, {:.0f} frames/s".format(
+            elapsed, size / elapsed / 1e6, frames / elapsed))
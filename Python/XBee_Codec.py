@@ -0,0 +1,99 @@
+"""
+Escaping and unescaping of XBee API mode 2 frames.
+
+Both directions work on whole buffers with bytes methods (translate,
+  replace, split) that run in C, rather than looking at one byte at a time in
+  Python.  Buffers without any reserved bytes are copied unchanged.
+"""
+
+RESERVED = b'\x7E\x7D\x11\x13'
+
+# Escape 0x7D first so the markers added for the other bytes are left alone
+ESCAPES = ((b'\x7D', b'\x7D\x5D'),
+           (b'\x7E', b'\x7D\x5E'),
+           (b'\x11', b'\x7D\x31'),
+           (b'\x13', b'\x7D\x33'))
+
+# Unescape 0x7D last so the bytes it produces aren't read as markers
+UNESCAPES = tuple((escaped, original) for original, escaped in ESCAPES[1:]) + \
+    ((b'\x7D\x5D', b'\x7D'),)
+
+
+def Escape(msg):
+    """
+    Escapes reserved characters in an XBee message.
+
+    Inputs:
+      msg: A bytes or bytearray object to be escaped.  Unlike the driver
+           Escape methods, the first byte is not treated as a start delimiter.
+
+    Outputs:
+      A bytearray object with every reserved byte replaced by 0x7D followed
+        by the byte XOR 0x20
+    """
+    # Deleting the reserved bytes is a cheap test for whether there are any
+    if len(msg.translate(None, RESERVED)) == len(msg):
+        return bytearray(msg)
+
+    data = msg
+    for original, escaped in ESCAPES:
+        data = data.replace(original, escaped)
+    # A bytearray's replace() already returns a new bytearray
+    return data if isinstance(data, bytearray) else bytearray(data)
+
+
+def EscapeFrame(frame):
+    """
+    Escapes a complete frame, leaving the start delimiter alone.
+
+    Inputs:
+      frame: A bytearray object holding a frame that starts with 0x7E
+
+    Outputs:
+      The same bytearray if nothing needed escaping, otherwise a new one
+    """
+    # Only the start delimiter should be deleted
+    if len(frame.translate(None, RESERVED)) == len(frame) - 1:
+        return frame
+
+    escaped = bytearray(frame[:1])
+    escaped.extend(Escape(frame[1:]))
+    return escaped
+
+
+def Unescape(msg):
+    """
+    Restores the original characters of an escaped XBee message.
+
+    Inputs:
+      msg: A bytes or bytearray object containing a raw XBee message
+           minus the start delimeter
+
+    Outputs:
+      A bytearray object with the original characters, or None if the message
+        ends on an escape byte or contains an invalid escape sequence
+    """
+    escapes = msg.count(b'\x7D')
+    if not escapes:
+        return bytearray(msg)
+
+    if msg[-1] == 0x7D:
+        # Last byte indicates an escape, can't unescape that
+        return None
+
+    out = msg
+    for escaped, original in UNESCAPES:
+        out = out.replace(escaped, original)
+    if len(out) == len(msg) - escapes:
+        return out if isinstance(out, bytearray) else bytearray(out)
+
+    # Escaped bytes other than the four reserved ones; not produced by an
+    #  XBee, but undo them the generic way for compatibility.
+    parts = msg.split(b'\x7D')
+    out = bytearray(parts[0])
+    for part in parts[1:]:
+        if not part:
+            return None
+        out.append(part[0] ^ 0x20)
+        out.extend(part[1:])
+    return out
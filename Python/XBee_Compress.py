@@ -0,0 +1,178 @@
+"""
+Payload compression for small, repetitive messages.
+
+Each compressed payload starts with a one byte marker naming its codec:
+  RAW (0x00) for payloads sent as they are, DEFLATE (0x01) for plain raw
+  deflate, and any other value for deflate with the shared dictionary
+  registered under it.  Small messages hardly compress on their own; a
+  dictionary trained on typical messages, known to both ends in advance,
+  supplies the repeated text so only what differs is sent.
+
+A payload is sent raw whenever compression wouldn't make it smaller, so
+  the marker is the most it ever costs.  Both ends must use a Codec with
+  the same dictionaries.
+"""
+import zlib
+from collections import Counter
+
+RAW = 0x00
+DEFLATE = 0x01
+OVERHEAD = 1
+
+# Receive packets, whose payloads are decoded
+RECEIVED = (0x80, 0x81, 0x90)
+
+
+def Train(samples, size=1024, shortest=4, longest=32):
+    """
+    Builds a shared dictionary from sample messages: the substrings that
+      would save the most, most useful last, where deflate finds them
+      closest.
+
+    Inputs:
+      samples: Typical messages, as bytes
+      size: Most bytes in the dictionary
+      shortest, longest: Lengths of the substrings considered
+
+    Outputs:
+      The dictionary, as bytes
+    """
+    counts = Counter()
+    for sample in samples:
+        seen = set()
+        for length in range(shortest, min(longest, len(sample)) + 1):
+            for i in range(len(sample) - length + 1):
+                seen.add(sample[i:i + length])
+        # Count the messages a substring appears in, not how often
+        counts.update(seen)
+
+    chosen = []
+    used = 0
+    # Longer strings first so their substrings aren't chosen separately
+    ranked = sorted(((count * len(s), s) for s, count in counts.items()
+                     if count > 1), key=lambda x: (-x[0], -len(x[1])))
+    for _, s in ranked:
+        if used + len(s) > size:
+            continue
+        if any(s in c for c in chosen):
+            continue
+        chosen.append(s)
+        used += len(s)
+        if used >= size - shortest:
+            break
+    return b''.join(reversed(chosen))
+
+
+class Codec():
+    """
+    Compresses payloads with an optional shared dictionary.
+
+    Counters:
+      encoded: Payloads compressed
+      raw: Payloads sent raw because compression didn't help
+      saved: Bytes saved over sending every payload raw, without a marker
+      errors: Received payloads that couldn't be decoded
+    """
+
+    def __init__(self, dictionaries=None, default=None, level=9):
+        """
+        Inputs:
+          dictionaries: Optional {marker: dictionary} of shared
+            dictionaries, markers 0x02 to 0xFF
+          default: Marker of the dictionary Encode() uses unless told
+            otherwise (default: the only dictionary, or none)
+          level: zlib compression level
+        """
+        dictionaries = dictionaries or {}
+        for marker in dictionaries:
+            if not 0x02 <= marker <= 0xFF:
+                raise ValueError("Dictionary markers must be 0x02 to 0xFF")
+        if default is None:
+            default = (list(dictionaries)[0] if len(dictionaries) == 1
+                       else DEFLATE)
+        self.default = default
+
+        # Primed once; each message works on a copy
+        self.compressors = {DEFLATE: zlib.compressobj(level, zlib.DEFLATED,
+                                                      -15, 9)}
+        self.decompressors = {DEFLATE: zlib.decompressobj(-15)}
+        for marker, zdict in dictionaries.items():
+            self.compressors[marker] = zlib.compressobj(
+                level, zlib.DEFLATED, -15, 9, zlib.Z_DEFAULT_STRATEGY, zdict)
+            self.decompressors[marker] = zlib.decompressobj(-15, zdict)
+
+        self.encoded = 0
+        self.raw = 0
+        self.saved = 0
+        self.errors = 0
+
+    def Encode(self, msg, marker=None):
+        """
+        Inputs:
+          msg: A payload, in bytes or bytearray format
+          marker: Optional dictionary to use (default: `default`)
+
+        Outputs:
+          The marked payload, compressed if that made it smaller
+        """
+        marker = self.default if marker is None else marker
+        compressor = self.compressors[marker].copy()
+        packed = compressor.compress(msg) + compressor.flush()
+        if len(packed) < len(msg):
+            self.encoded += 1
+            self.saved += len(msg) - len(packed) - OVERHEAD
+            return bytes(bytearray((marker,))) + packed
+
+        self.raw += 1
+        self.saved -= OVERHEAD
+        return bytes(bytearray((RAW,))) + bytes(msg)
+
+    def Decode(self, payload):
+        """
+        Inputs:
+          payload: A marked payload
+
+        Outputs:
+          The original payload.  Raises ValueError if it can't be decoded.
+        """
+        if not payload:
+            raise ValueError("Empty payload has no codec marker")
+        marker = payload[0]
+        if marker == RAW:
+            return bytes(payload[1:])
+
+        decompressor = self.decompressors.get(marker)
+        if decompressor is None:
+            raise ValueError("Unknown codec marker 0x{:02X}".format(marker))
+        decompressor = decompressor.copy()
+        try:
+            return decompressor.decompress(payload[1:]) + decompressor.flush()
+        except zlib.error as exc:
+            raise ValueError("Corrupt compressed payload: {}".format(exc))
+
+    def Unpack(self, frame):
+        """
+        Decodes the payload of a received packet in place of the original.
+          The frame's length bytes and checksum still describe the packet
+          as it was received.
+
+        Inputs:
+          frame: An XBee_Frames object
+
+        Outputs:
+          A frame of the same type, or None if its payload couldn't be
+            decoded.  Frames other than receive packets are returned as
+            they are.
+        """
+        if frame.api_id not in RECEIVED:
+            return frame
+        try:
+            payload = self.Decode(frame.payload)
+        except ValueError:
+            self.errors += 1
+            return None
+        end = len(frame) - len(frame.payload) - 1
+        buffer = frame.buffer[:end]
+        buffer += payload
+        buffer.append(frame.buffer[-1])
+        return type(frame)(buffer)
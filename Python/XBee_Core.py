@@ -0,0 +1,485 @@
+from time import perf_counter
+from XBee_Decoder import Decoder
+import XBee_Codec
+import XBee_Compress
+import XBee_Frames
+import XBee_Protocol
+from XBee_Address import AddressTable
+from XBee_Tracker import Tracker
+from XBee_TxQueue import TxQueue
+
+
+class Core(object):
+    """
+    Everything the XBee drivers have in common: decoding received bytes,
+      building and sending frames, frame ID tracking, batching and tracing.
+
+    What differs between module families comes from an XBee_Protocol.Family.
+      Each transport (polling, threaded, asyncio) subclasses Core, opens
+      `self.serial` and implements Deliver() to queue received messages.
+    """
+    family = XBee_Protocol.FAMILIES[XBee_Protocol.SERIES1]
+
+    def __init__(self, trace=None, family=None, metrics=None):
+        """
+        Inputs:
+          trace: Optional XBee_Trace object that records every frame
+            sent and received (default: no tracing)
+          family: Optional XBee_Protocol family name, overriding the
+            driver's default
+          metrics: Optional XBee_Metrics.Metrics object that counts and
+            times every frame (default: no metrics)
+        """
+        if family is not None:
+            self.family = XBee_Protocol.FAMILIES[family]
+        self.trace = trace
+        self.metrics = metrics
+        self.decoder = Decoder()
+        # Separate decoder for Validate(), so it can't disturb the stream
+        self.validator = Decoder()
+        self.tracker = Tracker()
+        self.txq = None
+        self.codec = None
+        self.capture = None
+        self.dispatcher = None
+        # 64 to 16 bit addresses learned from received frames
+        self.addresses = AddressTable() if self.family.network else None
+
+    @property
+    def payload(self):
+        """ Most bytes of a message one Send() carries in a single packet """
+        if self.codec:
+            return self.family.payload - XBee_Compress.OVERHEAD
+        return self.family.payload
+
+    def Compress(self, codec):
+        """
+        Compresses every payload sent and decodes every packet received.
+
+        Inputs:
+          codec: An XBee_Compress.Codec, or None to stop compressing
+        """
+        self.codec = codec
+
+    def Capture(self, recorder):
+        """
+        Records every chunk read from serial, before it is decoded.
+
+        Inputs:
+          recorder: An XBee_Capture.Recorder, or None to stop recording
+        """
+        self.capture = recorder
+
+    def Dispatch(self, dispatcher):
+        """
+        Offers every received frame to a dispatcher's handlers first.
+          Frames no handler takes are delivered to Receive() as before.
+
+        Inputs:
+          dispatcher: An XBee_Dispatch.Dispatcher, or None to stop
+        """
+        self.dispatcher = dispatcher
+
+    def Deliver(self, frame):
+        """
+        Queues a received message for the application.  Implemented by
+          each transport.
+        """
+        raise NotImplementedError
+
+    def Received(self, chunk):
+        """
+        Decodes a chunk of serial data and accepts every complete frame.
+        """
+        if self.capture:
+            self.capture.Write(chunk)
+        metrics = self.metrics
+        if not metrics:
+            for frame in self.decoder.Feed(chunk):
+                self.Accept(frame)
+            return
+
+        metrics.reads.Add(len(chunk))
+        start = perf_counter()
+        frames = self.decoder.Feed(chunk)
+        elapsed = perf_counter() - start
+        metrics.decode.Add(elapsed)
+        if metrics.hook:
+            metrics.hook('decode', elapsed)
+        for frame in frames:
+            self.Accept(frame)
+
+    def Discard(self):
+        """
+        Drops everything received but not yet decoded, e.g. after the baud
+          rate changes.
+        """
+        self.serial.reset_input_buffer()
+        self.decoder.Reset()
+
+    def Accept(self, frame):
+        """
+        Traces a valid frame, then either completes the request waiting on
+          it or delivers it to the application.
+
+        Inputs:
+          frame: An unescaped frame as returned by the decoder
+        """
+        if self.trace:
+            self.trace.Rx(frame)
+        if self.metrics:
+            self.Measure(frame)
+            return
+        frame = XBee_Frames.Parse(frame, self.family.name)
+        if self.addresses is not None:
+            self.addresses.Learn(frame)
+        if self.codec:
+            frame = self.codec.Unpack(frame)
+            if frame is None:
+                return
+        if not self.tracker.Resolve(frame) and not (
+                self.dispatcher and self.dispatcher.Dispatch(frame)):
+            self.Deliver(frame)
+
+    def Measure(self, frame):
+        """
+        Accept() with metrics: counts the frame and times parsing and
+          delivery.
+        """
+        metrics = self.metrics
+        start = perf_counter()
+        frame = XBee_Frames.Parse(frame, self.family.name)
+        if self.addresses is not None:
+            self.addresses.Learn(frame)
+        if self.codec:
+            frame = self.codec.Unpack(frame)
+            if frame is None:
+                return
+        parsed = perf_counter()
+        metrics.rx[frame.api] += 1
+        metrics.parse.Add(parsed - start)
+        if not self.tracker.Resolve(frame) and not (
+                self.dispatcher and self.dispatcher.Dispatch(frame)):
+            self.Deliver(frame)
+        if metrics.hook:
+            metrics.hook('parse', parsed - start)
+            metrics.hook('deliver', perf_counter() - parsed)
+
+    def Validate(self, msg):
+        """
+        Parses a byte or bytearray object to verify the contents are a
+          properly formatted XBee message, and queues it if so.  Why a
+          message failed is counted in the `validator` decoder.
+
+        Inputs: An incoming XBee message, minus the start delimiter
+
+        Outputs: True or False, indicating message validity
+        """
+        self.validator.Reset()
+        frames = self.validator.Feed(bytearray(b'\x7E') + msg)
+        if self.validator.state == Decoder.FRAME:
+            # Shorter than its length field says
+            self.validator.lengths += 1
+        for frame in frames:
+            self.Accept(frame)
+        return bool(frames)
+
+    def SendStr(self, msg, addr=None, options=0x01, frameid=0x00):
+        """
+        Inputs:
+          msg: A message, in string format, to be sent
+          addr: The 16 bit address of the destination XBee, or its 64 bit
+            address if above 0xFFFF
+            (default: broadcast, 0xFFFF on series 1 and 0xFFFE on series 2)
+          options: Optional byte to specify transmission options
+            (default 0x01: disable acknowledge)
+          frameid: Optional frameid, only used if Tx status is desired
+        Returns:
+          Number of bytes sent
+        """
+        return self.Send(msg.encode('utf-8'), addr, options, frameid)
+
+    def Send(self, msg, addr=None, options=0x01, frameid=0x00):
+        """
+        Inputs:
+          msg: A message, in bytes or bytearray format, to be sent to an XBee
+          addr: The 16 bit address of the destination XBee, or its 64 bit
+            address if above 0xFFFF
+            (default: broadcast, 0xFFFF on series 1 and 0xFFFE on series 2)
+          options: Optional byte to specify transmission options
+            (default 0x01: disable ACK)
+          frameid: Optional frameid, only used if transmit status is desired
+        Returns:
+          Number of bytes sent
+        """
+        if not msg:
+            return 0
+
+        if addr is None:
+            addr = self.family.broadcast
+        if self.codec:
+            msg = self.codec.Encode(msg)
+        frame = self.Tx(msg, addr, options, frameid)
+
+        if self.trace:
+            self.trace.Tx(frame)
+        if self.metrics:
+            tx = self.family.Tx64 if addr > 0xFFFF else self.family.Tx
+            self.metrics.Sent(tx.api, 1, len(frame))
+        return self.Write(frame)
+
+    def SendMany(self, msgs, options=0x01, frameid=0x00):
+        """
+        Builds a batch of messages into one buffer and writes it at once.
+
+        Inputs:
+          msgs: An iterable of (addr, msg) tuples, where addr is the 16 or
+            64 bit address of the destination XBee, as for Send(), and msg
+            is in bytes or bytearray format
+          options: Optional byte to specify transmission options
+            (default 0x01: disable ACK)
+          frameid: Optional frameid, only used if transmit status is desired
+        Returns:
+          Number of bytes sent
+        """
+        if self.codec:
+            msgs = [(addr, self.codec.Encode(msg)) for addr, msg in msgs
+                    if msg]
+        elif self.metrics:
+            msgs = list(msgs)
+        frames = bytearray()
+        count = 0
+        for addr, msg in msgs:
+            if msg:
+                frames += self.Tx(msg, addr, options, frameid)
+                count += 1
+        if not count:
+            return 0
+
+        if self.trace:
+            self.trace.Tx(frames)
+        if self.metrics:
+            # Counted by API type, as Send() does
+            wide = sum(1 for addr, msg in msgs if msg and addr > 0xFFFF)
+            nbytes = len(frames)
+            for tx, n in ((self.family.Tx, count - wide),
+                          (self.family.Tx64, wide)):
+                if n:
+                    self.metrics.Sent(tx.api, n, nbytes)
+                    nbytes = 0
+        return self.Write(frames)
+
+    def Tx(self, msg, addr, options=0x01, frameid=0x00):
+        """
+        Builds an escaped transmit request.  On series 2, a 64 bit
+          destination gets its 16 bit network address from `addresses`,
+          and a 16 bit one is sent with the 64 bit address marked unknown
+          rather than broadcast.
+
+        Inputs:
+          As for Send(), except that addr is required
+
+        Outputs:
+          A bytearray ready to be written to serial
+        """
+        family = self.family
+        if addr > 0xFFFF:
+            if not family.network:
+                return family.Tx64(msg, addr, options, frameid)
+            return family.Tx64(msg, self.addresses.Lookup(addr), options,
+                               frameid, addr64=addr)
+        if family.network and addr != family.broadcast:
+            return family.Tx(msg, addr, options, frameid,
+                             addr64=XBee_Protocol.UNKNOWN)
+        return family.Tx(msg, addr, options, frameid)
+
+    def SendTracked(self, msg, addr=None, options=0x01, timeout=None):
+        """
+        Sends a message with a frame ID allocated from the tracker, so
+          the XBee reports back whether it was delivered.
+
+        Inputs:
+          msg: A message, in bytes or bytearray format, to be sent to an XBee
+          addr: The 16 bit address of the destination XBee, or its 64 bit
+            address if above 0xFFFF
+          options: Optional byte to specify transmission options
+          timeout: Optional number of seconds to wait for the transmit status
+        Returns:
+          A concurrent.futures.Future that resolves to the transmit status
+          frame (XBee_Frames.TxStatus or ZigBeeTxStatus), or fails with a
+          TimeoutError.  The future is cancelled if nothing was sent.
+        """
+        frameid, future = self.tracker.Allocate(timeout)
+        try:
+            sent = self.Send(msg, addr, options, frameid)
+        except Exception:
+            self.tracker.Release(frameid)
+            raise
+
+        if not sent:
+            self.tracker.Release(frameid)
+        return future
+
+    def SendAT(self, command, parameter=b'', queue=False, timeout=None):
+        """
+        Sends an AT command to the local XBee.
+
+        Inputs:
+          command: Two letter command, in bytes format, e.g. b'MY'
+          parameter: Optional value to set, in bytes or bytearray format
+            (default: read the parameter)
+          queue: Optional; if True the change waits for an AC or WR
+            command before it takes effect (API 0x09)
+          timeout: Optional number of seconds to wait for the response
+        Returns:
+          A concurrent.futures.Future that resolves to the
+          XBee_Frames.ATResponse, or fails with a TimeoutError
+        """
+        encode = XBee_Protocol.ATQueue if queue else XBee_Protocol.ATCommand
+        return self.Request(encode, parameter, timeout, command=command)[1]
+
+    def SendRemoteAT(self, command, addr=None, addr64=None, parameter=b'',
+                     options=0x02, timeout=None):
+        """
+        Sends an AT command over the air to another XBee.
+
+        Inputs:
+          command: Two letter command, in bytes format, e.g. b'MY'
+          addr: The 16 bit address of the remote XBee
+          addr64: The 64 bit address of the remote XBee, used instead of
+            `addr` if given
+          parameter: Optional value to set, in bytes or bytearray format
+            (default: read the parameter)
+          options: Optional byte to specify remote command options
+            (default 0x02: apply changes right away)
+          timeout: Optional number of seconds to wait for the response
+        Returns:
+          A concurrent.futures.Future that resolves to the
+          XBee_Frames.RemoteATResponse, or fails with a TimeoutError
+        """
+        if addr64 is None:
+            addr64 = XBee_Protocol.UNKNOWN
+            if addr is None:
+                raise ValueError("A remote AT command needs an address")
+        else:
+            addr = XBee_Protocol.USE_64
+        return self.Request(XBee_Protocol.RemoteAT, parameter, timeout,
+                            command=command, addr=addr, addr64=addr64,
+                            options=options)[1]
+
+    def Request(self, encode, msg, timeout=None, **fields):
+        """
+        Sends a frame with a frame ID allocated from the tracker.
+
+        Inputs:
+          encode: An XBee_Protocol encoder
+          msg: The frame's payload
+          timeout: Optional number of seconds to wait for the response
+          fields: The frame's fields, other than the frame ID
+        Returns:
+          A tuple of the frame ID and a concurrent.futures.Future that
+          resolves to the response frame
+        """
+        frameid, future = self.tracker.Allocate(timeout)
+        try:
+            frame = encode(msg, frameid=frameid, **fields)
+            if self.trace:
+                self.trace.Tx(frame)
+            if self.metrics:
+                self.metrics.Sent(encode.api, 1, len(frame))
+            self.Write(frame)
+        except Exception:
+            self.tracker.Release(frameid)
+            raise
+        return frameid, future
+
+    def Batch(self, window=0.002, budget=256, latency=0.01):
+        """
+        Queues frames from Send() and writes them to serial in batches
+          from a writer thread, instead of one write per frame.
+
+        Inputs:
+          window: Seconds to wait for another frame before writing
+          budget: Number of queued bytes that triggers an immediate write
+          latency: Longest time in seconds a queued frame may wait
+        """
+        if self.txq is None:
+            self.txq = TxQueue(self.serial.write, window, budget, latency)
+
+    def Write(self, frame):
+        """
+        Writes an escaped frame to serial, or queues it if batching.
+
+        Returns:
+          Number of bytes written or queued
+        """
+        if self.txq is not None:
+            return self.txq.Put(frame)
+        return self.serial.write(frame)
+
+    def flush(self, timeout=None):
+        """
+        Writes any frames still waiting in the transmit queue.
+
+        Returns:
+          False if a write failed or the timeout expired
+        """
+        if self.txq is None:
+            return True
+        return self.txq.flush(timeout)
+
+    def Unescape(self, msg):
+        """
+        Helper function to unescaped an XBee API message.
+
+        Inputs:
+          msg: An byte or bytearray object containing a raw XBee message
+               minus the start delimeter
+
+        Outputs:
+          XBee message with original characters.
+        """
+        return XBee_Codec.Unescape(msg)
+
+    def Escape(self, msg):
+        """
+        Escapes reserved characters before an XBee message is sent.
+
+        Inputs:
+          msg: A bytes or bytearray object containing an original message to
+               be sent to an XBee
+
+        Outputs:
+          A bytearray object prepared to be sent to an XBee in API mode
+        """
+        # The start delimiter is the only byte left unescaped
+        escaped = bytearray(msg[:1])
+        escaped.extend(XBee_Codec.Escape(msg[1:]))
+
+        return escaped
+
+    def CheckSum(self, msg):
+        """
+        Calculate the checksum byte for an XBee message.
+
+        Input:
+          msg: An unescaped byte or bytearray object containing a
+            full XBee message
+
+        Output:
+          A single byte containing the message checksum
+        """
+        return 0xFF - (sum(msg[3:]) & 0xFF)
+
+    def format(self, msg):
+        """
+        Formats a byte or bytearray object into a more human readable string
+          where each bytes is represented by two ascii characters and a space
+
+        Input:
+          msg: A bytes or bytearray object
+
+        Output:
+          A string representation
+        """
+        return " ".join("{:02x}".format(b) for b in msg)
@@ -0,0 +1,152 @@
+from XBee_Codec import Unescape
+
+
+class Decoder():
+    """
+    Resumable decoder for a stream of escaped XBee API frames.
+
+    Serial chunks are handed to Feed() as they arrive.  The decoder
+      remembers where it stopped (hunting for a start delimiter, waiting
+      for the length, or collecting the frame body and checksum) so each
+      incoming byte is only looked at once, no matter how the stream is
+      fragmented.
+
+    Frames are returned unescaped and minus the start delimiter:
+      MSB, LSB, API type, frame data, checksum.
+    """
+    HUNT = 0
+    FRAME = 1
+
+    def __init__(self, minimum=0):
+        """
+        Inputs:
+          minimum: Optional minimum length of an unescaped frame, from MSB
+            through checksum.  Shorter frames are dropped.
+        """
+        self.minimum = minimum
+        self.resyncs = 0
+        self.discarded = 0
+        self.frames = 0
+        # Frames shorter than their length field or the minimum
+        self.lengths = 0
+        # Complete frames with a bad checksum or escape sequence
+        self.checksums = 0
+        # Escape markers in the frames returned
+        self.escaped = 0
+        self.Reset()
+
+    def Reset(self):
+        """
+        Drops any partially received frame and starts hunting for
+          the next start delimiter.
+        """
+        self.state = self.HUNT
+        self.raw = bytearray()
+        self.escapes = 0
+        self.needed = 0
+
+    def Feed(self, chunk):
+        """
+        Decodes as many frames as possible from a chunk of serial data.
+
+        Inputs:
+          chunk: A bytes or bytearray object read from serial
+
+        Outputs:
+          A list of unescaped frames with a valid length and checksum
+        """
+        frames = []
+        pos = 0
+        end = len(chunk)
+        # Segments are appended to the frame straight from the chunk
+        view = memoryview(chunk)
+        while pos < end:
+            start = chunk.find(b'\x7E', pos)
+
+            if self.state == self.HUNT:
+                if start < 0:
+                    self.discarded += end - pos
+                    return frames
+                self.discarded += start - pos
+                self.state = self.FRAME
+                pos = start + 1
+                continue
+
+            # A start delimiter is never escaped, so one showing up before
+            #  the current frame is complete means bytes were lost.
+            stop = end if start < 0 else start
+            collected = len(self.raw)
+            self.raw += view[pos:stop]
+            self.escapes += self.raw.count(b'\x7D', collected)
+            pos = stop
+
+            frame = self.Collect()
+            if frame is not None:
+                if len(frame) >= self.minimum:
+                    self.frames += 1
+                    frames.append(frame)
+                else:
+                    self.lengths += 1
+            elif start >= 0 and self.state == self.FRAME:
+                self.resyncs += 1
+                self.lengths += 1
+                self.discarded += len(self.raw) + 1
+                self.Reset()
+
+        return frames
+
+    def Collect(self):
+        """
+        Checks whether enough of the current frame has been received.
+
+        Outputs:
+          The unescaped frame once it is complete and its checksum is
+            correct, otherwise None.  A complete frame with a bad checksum
+            is discarded and the decoder resynchronizes.
+        """
+        # Every 0x7D in the raw bytes is an escape marker, or trailing noise
+        received = len(self.raw) - self.escapes
+        if received < 2:
+            return None
+
+        if not self.needed:
+            header = self.raw[:4]
+            if header[-1] == 0x7D:
+                # Wait for the byte being escaped
+                del header[-1]
+            header = Unescape(header)
+            if not header or len(header) < 2:
+                return None
+            # MSB, LSB, frame data (LSB bytes), checksum
+            self.needed = ((header[0] << 8) | header[1]) + 3
+
+        # The frame ends once `needed` bytes are unescaped, so only 0x7Ds
+        #  before that are escape markers; anything after it is noise
+        raw = self.raw
+        stop = self.needed
+        while True:
+            markers = raw.count(b'\x7D', 0, stop)
+            if self.needed + markers == stop:
+                break
+            stop = self.needed + markers
+        if stop > len(raw):
+            return None
+
+        # Anything between the end of a frame and the next start
+        #  delimiter is noise
+        noise = len(raw) - stop
+        del raw[stop:]
+        # Without escapes the collected bytes are the frame; Reset() starts
+        #  a new buffer, so it is handed over rather than copied
+        frame = Unescape(raw) if markers else raw
+        checked = frame is not None and (sum(frame[2:]) & 0xFF) == 0xFF
+        if not checked:
+            self.resyncs += 1
+            self.checksums += 1
+            self.discarded += stop + noise + 1
+        else:
+            self.escaped += markers
+            self.discarded += noise
+        self.Reset()
+
+        return frame if checked else None
@@ -0,0 +1,193 @@
+"""
+Routes received frames to handlers subscribed by API type, source address
+  and payload prefix, instead of every application polling Receive() and
+  testing each frame against each of its handlers.
+
+    dispatcher = XBee_Dispatch.Dispatcher()
+    xbee.Dispatch(dispatcher)
+
+    @dispatcher.On(api=0x81, prefix=b'T:')
+    def Temperature(frame):
+        print(frame.source, bytes(frame.payload[2:]))
+
+Handlers run in whichever thread receives the frame: the reader thread of
+  the threaded driver, or the caller of Receive() or Rx() with the polling
+  driver.  Frames no handler takes are queued for Receive() as before.
+
+Each subscription is filed under its API type and source, either of which
+  may be left out to match any, so a frame finds its candidates with at
+  most four dictionary lookups.  Prefixes are indexed by length, one lookup
+  per distinct prefix length in use.  Dispatch time therefore doesn't grow
+  with the number of subscriptions, only with the number of handlers that
+  match.
+"""
+import logging
+import threading
+
+
+class Bucket():
+    """
+    The subscriptions for one (API type, source) pair.  Replaced, never
+      changed, so Dispatch() can read it without locking.
+    """
+    __slots__ = ('handlers', 'prefixes', 'lengths')
+
+    def __init__(self, handlers=(), prefixes=None):
+        # Handlers for any payload
+        self.handlers = handlers
+        # {prefix: handlers}
+        self.prefixes = prefixes or {}
+        self.lengths = tuple(sorted(set(len(p) for p in self.prefixes)))
+
+
+class Dispatcher():
+    """
+    Hash-indexed subscriptions for received frames.
+
+    Counters:
+      dispatched: Frames taken by at least one handler
+      unmatched: Frames no handler subscribed to
+      errors: Exceptions raised by handlers, which are logged to the
+        "XBee" logger and otherwise ignored
+    """
+
+    def __init__(self, logger="XBee"):
+        """
+        Inputs:
+          logger: A logging.Logger, or the name of one, for handler errors
+        """
+        if not isinstance(logger, logging.Logger):
+            logger = logging.getLogger(logger)
+        self.logger = logger
+        # (api, source): Bucket, with None for "any"
+        self.index = {}
+        self.lock = threading.Lock()
+
+        self.dispatched = 0
+        self.unmatched = 0
+        self.errors = 0
+
+    def Subscribe(self, handler, api=None, source=None, prefix=None):
+        """
+        Calls `handler(frame)` for every received frame that matches.
+
+        Inputs:
+          handler: A function taking an XBee_Frames object
+          api: Optional API identifier, e.g. 0x81 (default: any)
+          source: Optional source address, as the frame reports it: 16 bit
+            for Rx16, 64 bit for Rx64, ZigBeeRx and RemoteATResponse
+            (default: any)
+          prefix: Optional bytes the payload must start with
+            (default: any payload, and frames without one)
+
+        Outputs:
+          A subscription, for Unsubscribe()
+        """
+        prefix = bytes(prefix) if prefix else None
+        key = (api, source)
+        with self.lock:
+            bucket = self.index.get(key, Bucket())
+            if prefix is None:
+                bucket = Bucket(bucket.handlers + (handler,), bucket.prefixes)
+            else:
+                prefixes = dict(bucket.prefixes)
+                prefixes[prefix] = prefixes.get(prefix, ()) + (handler,)
+                bucket = Bucket(bucket.handlers, prefixes)
+            self.index[key] = bucket
+        return (api, source, prefix, handler)
+
+    def Unsubscribe(self, subscription):
+        """
+        Removes a subscription made by Subscribe().
+
+        Outputs:
+          True if it was subscribed
+        """
+        api, source, prefix, handler = subscription
+        key = (api, source)
+        with self.lock:
+            bucket = self.index.get(key)
+            if bucket is None:
+                return False
+            handlers = bucket.handlers
+            prefixes = dict(bucket.prefixes)
+            if prefix is None:
+                if handler not in handlers:
+                    return False
+                handlers = tuple(h for h in handlers if h is not handler)
+            else:
+                if handler not in prefixes.get(prefix, ()):
+                    return False
+                remaining = tuple(h for h in prefixes[prefix]
+                                  if h is not handler)
+                if remaining:
+                    prefixes[prefix] = remaining
+                else:
+                    del prefixes[prefix]
+            if handlers or prefixes:
+                self.index[key] = Bucket(handlers, prefixes)
+            else:
+                del self.index[key]
+        return True
+
+    def On(self, api=None, source=None, prefix=None):
+        """
+        Subscribe() as a decorator.
+        """
+        def Decorate(handler):
+            self.Subscribe(handler, api, source, prefix)
+            return handler
+        return Decorate
+
+    def Dispatch(self, frame):
+        """
+        Calls every handler subscribed to a frame.  More specific
+          subscriptions are called first: API type and source, then API
+          type alone, then source alone, then neither.
+
+        Inputs:
+          frame: An XBee_Frames object
+
+        Outputs:
+          True if any handler was called
+        """
+        index = self.index
+        api = frame.api
+        source = getattr(frame, 'source', None)
+        payload = getattr(frame, 'payload', None)
+        if source is None:
+            keys = ((api, None), (None, None))
+        else:
+            keys = ((api, source), (api, None), (None, source), (None, None))
+        called = False
+        for key in keys:
+            bucket = index.get(key)
+            if bucket is None:
+                continue
+            if bucket.handlers:
+                self.Call(bucket.handlers, frame)
+                called = True
+            if payload is None:
+                continue
+            for length in bucket.lengths:
+                if length > len(payload):
+                    break
+                handlers = bucket.prefixes.get(bytes(payload[:length]))
+                if handlers:
+                    self.Call(handlers, frame)
+                    called = True
+
+        if called:
+            self.dispatched += 1
+        else:
+            self.unmatched += 1
+        return called
+
+    def Call(self, handlers, frame):
+        for handler in handlers:
+            try:
+                handler(frame)
+            except Exception:
+                self.errors += 1
+                self.logger.exception("Handler %r failed on %r",
+                                      handler, frame)
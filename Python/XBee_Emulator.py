@@ -0,0 +1,466 @@
+"""
+A virtual XBee in API mode 2, attached to a pty so the drivers can open it
+  by name like a real serial port, e.g.
+
+    radio = VirtualRadio()
+    xbee = XBee_Threaded.XBee(radio.port)
+    radio.Stream(rate=100, size=32)
+
+The radio answers TX requests with TX status frames and AT commands from
+  its own parameters, and injects RX frames at a configurable rate and
+  size.  Two radios can be linked, so what one transmits the other
+  receives, optionally losing packets on the way, and remote AT commands
+  are answered by the linked radio.  It can split what it writes into
+  small fragments, corrupt frames, and drop TX requests that overflow its
+  serial receive buffer, like a real module without flow control.  With a
+  baud rate set, bytes take as long to reach the host as they would over a
+  real UART, and bytes exchanged with a host port set to another rate are
+  garbled; ATBD and ATAC change the rate as on a real module.
+
+Linux (or any POSIX system with ptys) only.
+"""
+import heapq
+import itertools
+import os
+import pty
+import random
+import select
+import struct
+import termios
+import threading
+import tty
+from collections import deque
+from time import time
+from XBee_Baud import RATES
+from XBee_Decoder import Decoder
+import XBee_Frames
+import XBee_Protocol
+
+# TX status delivery codes
+SUCCESS = 0x00
+NO_ACK = 0x01
+CCA_FAILURE = 0x02
+
+# Serial receive buffer of a series 1 module, in bytes
+BUFFER = 202
+# Baud rates by termios speed
+SPEEDS = dict((getattr(termios, 'B{}'.format(rate)), rate) for rate in RATES)
+# Bits per byte on the UART at 8N1
+BITS = 10
+
+
+class VirtualRadio(threading.Thread):
+    """
+    An emulated XBee serviced by its own thread.
+
+    Counters:
+      requests: TX requests received from the host
+      overflows: TX requests dropped because the receive buffer was full
+      lost: Packets to a linked radio lost on the way
+      statuses: TX status frames sent
+      injected: RX frames sent
+      corrupted: Frames sent with a damaged byte
+      commands: AT commands answered, local or remote
+      garbled: Chunks exchanged with the host at the wrong baud rate
+    """
+    # Longest the loop waits before checking for shutdown
+    wait = 0.1
+
+    def __init__(self, family=XBee_Protocol.SERIES1, address=0x0001,
+                 peers=(0x0002,), fragment=0, gap=0.0, corrupt=0.0,
+                 buffer=BUFFER, airrate=None, status=SUCCESS, delay=0.0,
+                 seed=None, baudrate=None):
+        """
+        Inputs:
+          family: XBee_Protocol.SERIES1 or SERIES2
+          address: 16 bit address of the radio
+          peers: 16 bit source addresses that injected frames come from,
+            used in turn
+          fragment: Most bytes per write to the host
+            (default 0: write whole frames)
+          gap: Seconds between fragments (default 0: write them back to
+            back, each with its own write)
+          corrupt: Probability that a frame sent to the host has one
+            byte damaged
+          buffer: Bytes the radio's serial receive buffer holds
+          airrate: Bytes per second the radio transmits, draining its buffer
+            (default: transmit instantly, so the buffer never fills)
+          status: Delivery status reported in TX status frames
+          delay: Seconds before a TX status frame is sent
+          seed: Optional seed for fragmentation and corruption
+          baudrate: Optional UART baud rate, one of RATES
+            (default: no UART: bytes reach the host at once, at any rate)
+        """
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.family = family
+        self.address = address
+        self.peers = itertools.cycle(peers)
+        self.rate = 0
+        self.size = 16
+        self.count = None
+        self.fragment = fragment
+        self.gap = gap
+        self.corrupt = corrupt
+        self.buffer = buffer
+        self.airrate = airrate
+        self.status = status
+        self.delay = delay
+        self.random = random.Random(seed)
+        self.baudrate = baudrate
+        self.address64 = 0x0013A20000000000 | address
+        # AT parameters, as the module reports them
+        self.parameters = {
+            b'MY': struct.pack('>H', address),
+            b'SH': struct.pack('>I', self.address64 >> 32),
+            b'SL': struct.pack('>I', self.address64 & 0xFFFFFFFF),
+            b'CH': b'\x0C',
+            b'PL': b'\x04',
+            b'ID': b'\x33\x32',
+            b'NI': b' ',
+            b'BD': bytearray((RATES.index(baudrate or 9600),)),
+        }
+
+        self.master, self.slave = pty.openpty()
+        tty.setraw(self.master)
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+        os.set_blocking(self.master, False)
+
+        self.decoder = Decoder()
+        self.transmitted = deque(maxlen=1024)
+        self.peer = None
+        self.loss = 0.0
+        self.outgoing = []
+        self.pending = deque()
+        self.tail = 0.0
+        self.sequence = itertools.count()
+        self.used = 0.0
+        self.drained = time()
+        self.stop = threading.Event()
+        self.lock = threading.Lock()
+        # Wakes the loop when frames are injected from another thread
+        self.wakeup, self.waker = os.pipe()
+
+        self.requests = 0
+        self.overflows = 0
+        self.statuses = 0
+        self.injected = 0
+        self.corrupted = 0
+        self.lost = 0
+        self.commands = 0
+        self.garbled = 0
+        self.restart = False
+        self.start()
+
+    def shutdown(self):
+        self.stop.set()
+        os.write(self.waker, b'\x00')
+        self.join()
+        for fd in (self.master, self.slave, self.wakeup, self.waker):
+            os.close(fd)
+
+    def Link(self, other, loss=0.0):
+        """
+        Links two radios both ways: packets one transmits to the other's
+          address, or to broadcast, are received by the other.
+
+        Inputs:
+          other: Another VirtualRadio of the same family
+          loss: Probability that a packet is lost over the air
+        """
+        self.peer, self.loss = other, loss
+        other.peer, other.loss = self, loss
+
+    def Stream(self, rate, size=16, count=None):
+        """
+        Starts injecting RX frames at a steady rate.  Call it once the host
+          has opened the port; opening a serial port discards whatever it
+          had already received.
+
+        Inputs:
+          rate: RX frames per second, 0 to stop
+          size: Payload bytes in each frame, at least 4.  Payloads start
+            with a 32 bit sequence number so lost frames can be found.
+          count: Optional number of frames to inject
+        """
+        with self.lock:
+            self.size = size
+            self.count = count
+            self.rate = rate
+            self.restart = True
+        os.write(self.waker, b'\x00')
+
+    def Inject(self, payload, source=None, rssi=0x28, options=0x00):
+        """
+        Sends an RX frame to the host, as if received over the air.
+
+        Inputs:
+          payload: Message, in bytes or bytearray format
+          source: Optional 16 bit source address (default: the next peer)
+          rssi: Signal strength reported by series 1 modules
+          options: Receive options byte
+        """
+        source = next(self.peers) if source is None else source
+        if self.family == XBee_Protocol.SERIES1:
+            frame = XBee_Protocol.BY_NAME['Rx16'].Encode(
+                payload, source, rssi, options)
+        else:
+            frame = XBee_Protocol.BY_NAME['ZigBeeRx'].Encode(
+                payload, 0x0013A20000000000 | source, source, options)
+        self.Schedule(frame)
+        self.injected += 1
+
+    def Schedule(self, frame, when=None):
+        """
+        Queues an escaped frame for the host, corrupted and split into
+          fragments as configured.
+        """
+        when = time() if when is None else when
+        if self.corrupt and self.random.random() < self.corrupt:
+            frame = bytearray(frame)
+            frame[self.random.randrange(len(frame))] ^= \
+                1 << self.random.randrange(8)
+            self.corrupted += 1
+
+        pieces = [frame]
+        if self.fragment:
+            pieces, start = [], 0
+            while start < len(frame):
+                end = start + self.random.randint(1, self.fragment)
+                pieces.append(frame[start:end])
+                start = end
+
+        rate = self.baudrate
+        with self.lock:
+            # The serial line is sequential: never overtake earlier frames
+            when = max(when, self.tail)
+            for piece in pieces:
+                if rate:
+                    # Written once its last byte would have arrived
+                    when += len(piece) * BITS / float(rate)
+                heapq.heappush(self.outgoing, (when, next(self.sequence),
+                                               bytes(piece), rate))
+                self.tail = when
+                when += self.gap
+        os.write(self.waker, b'\x00')
+
+    def run(self):
+        injecting = False
+
+        while not self.stop.is_set():
+            now = time()
+            with self.lock:
+                if self.restart:
+                    self.restart = False
+                    injecting = self.rate > 0
+                    interval = 1.0 / self.rate if injecting else None
+                    start, injections = now, 0
+            if injecting:
+                due = start + injections * interval
+                while due <= now:
+                    payload = struct.pack('>I', injections)
+                    self.Inject(payload + b'\x55' * (self.size - 4))
+                    injections += 1
+                    if injections == self.count:
+                        injecting = False
+                        break
+                    due = start + injections * interval
+
+            self.Flush(now)
+
+            timeout = self.wait
+            if injecting:
+                timeout = min(timeout, max(due - now, 0))
+            with self.lock:
+                if self.outgoing:
+                    timeout = min(timeout, max(self.outgoing[0][0] - now, 0))
+            writing = [self.master] if self.pending else []
+            readable, _, _ = select.select([self.master, self.wakeup],
+                                           writing, [], timeout)
+
+            if self.wakeup in readable:
+                os.read(self.wakeup, 512)
+            if self.master in readable:
+                try:
+                    chunk = os.read(self.master, 4096)
+                except (BlockingIOError, OSError):
+                    chunk = b''
+                if self.Mismatched(self.baudrate):
+                    self.garbled += 1
+                    chunk = b''
+                for frame in self.decoder.Feed(chunk):
+                    self.Request(XBee_Frames.Parse(frame, self.family))
+
+    def Flush(self, now):
+        """
+        Writes every fragment that is due, one write each.  What the host
+          hasn't read yet stays pending until the pty has room again.
+        """
+        with self.lock:
+            while self.outgoing and self.outgoing[0][0] <= now:
+                _, _, piece, rate = heapq.heappop(self.outgoing)
+                if self.Mismatched(rate):
+                    # What the host reads at the wrong rate is noise
+                    self.garbled += 1
+                    piece = bytes(self.random.randrange(256)
+                                  for _ in piece)
+                self.pending.append(piece)
+        while self.pending:
+            piece = self.pending[0]
+            try:
+                written = os.write(self.master, piece)
+            except BlockingIOError:
+                return
+            if written < len(piece):
+                self.pending[0] = piece[written:]
+                return
+            self.pending.popleft()
+
+    def Request(self, frame):
+        """
+        Handles a frame from the host.  TX requests are transmitted if they
+          fit in the receive buffer, then answered with a TX status frame
+          if they have a frame ID.
+        """
+        if frame.api_id in (0x08, 0x09):
+            self.Command(frame)
+            return
+        if frame.api_id == 0x17:
+            self.Remote(frame)
+            return
+        if not hasattr(frame, 'frameid') or not hasattr(frame, 'payload'):
+            return
+        self.requests += 1
+
+        now = time()
+        if self.airrate:
+            drained = (now - self.drained) * self.airrate
+            self.used = max(0.0, self.used - drained)
+            self.drained = now
+            if self.used + len(frame) > self.buffer:
+                self.overflows += 1
+                return
+            self.used += len(frame)
+            now += self.used / self.airrate
+
+        self.transmitted.append((frame.addr, bytes(frame.payload)))
+        peer = self.peer
+        if peer and self.Reaches(frame, peer):
+            if self.loss and self.random.random() < self.loss:
+                self.lost += 1
+            else:
+                peer.Inject(frame.payload, self.address)
+        if not frame.frameid:
+            return
+
+        if self.family == XBee_Protocol.SERIES1:
+            status = XBee_Protocol.BY_NAME['TxStatus'].Encode(
+                b'', frame.frameid, self.status)
+        else:
+            status = XBee_Protocol.BY_NAME['ZigBeeTxStatus'].Encode(
+                b'', frame.frameid, frame.addr, 0, self.status, 0)
+        self.Schedule(status, now + self.delay)
+        self.statuses += 1
+
+    def Mismatched(self, rate):
+        """
+        Outputs:
+          True if the host's port is set to a baud rate other than `rate`
+        """
+        if not rate:
+            return False
+        speed = termios.tcgetattr(self.master)[5]
+        return SPEEDS.get(speed) != rate
+
+    def Reaches(self, frame, peer):
+        """
+        Outputs:
+          True if a TX request is addressed to the peer radio or broadcast
+        """
+        addr64 = getattr(frame, 'addr64', XBee_Protocol.UNKNOWN)
+        if addr64 != XBee_Protocol.UNKNOWN:
+            return addr64 in (peer.address64, 0xFFFF)
+        return frame.addr in (peer.address, peer.address64, 0xFFFF, 0xFFFE)
+
+    def Answer(self, command, parameter):
+        """
+        Runs an AT command against the radio's parameters.
+
+        Outputs:
+          (status, value)
+        """
+        if command in (b'AC', b'WR'):
+            return XBee_Protocol.OK, b''
+        if command not in self.parameters:
+            return XBee_Protocol.INVALID_COMMAND, b''
+        if command == b'BD' and parameter and parameter[-1] >= len(RATES):
+            return XBee_Protocol.INVALID_PARAMETER, b''
+        if parameter:
+            self.parameters[command] = bytes(parameter)
+            return XBee_Protocol.OK, b''
+        return XBee_Protocol.OK, self.parameters[command]
+
+    def Command(self, frame):
+        """
+        Answers a local AT command with an AT response frame.
+        """
+        self.commands += 1
+        if frame.command == b'ND':
+            self.Discover(frame)
+            return
+        status, value = self.Answer(frame.command, frame.payload)
+        if frame.frameid:
+            self.Schedule(XBee_Protocol.BY_NAME['ATResponse'].Encode(
+                value, frame.frameid, frame.command, status))
+        if frame.command == b'AC' and self.baudrate:
+            # Changes take effect once the response has been sent
+            self.baudrate = RATES[self.parameters[b'BD'][-1]]
+
+    def Remote(self, frame):
+        """
+        Passes a remote AT command to the linked radio if it is addressed
+          to it, and sends back its response after `delay`, or a
+          transmission failure if it was lost.
+        """
+        peer = self.peer
+        if frame.addr == XBee_Protocol.USE_64:
+            reached = peer and frame.addr64 == peer.address64
+        else:
+            reached = peer and frame.addr == peer.address
+        if reached and self.loss and self.random.random() < self.loss:
+            self.lost += 1
+            reached = False
+
+        if reached:
+            peer.commands += 1
+            status, value = peer.Answer(frame.command, frame.payload)
+            source, source16 = peer.address64, peer.address
+        else:
+            status, value = XBee_Protocol.TX_FAILURE, b''
+            source, source16 = frame.addr64, frame.addr
+        if frame.frameid:
+            self.Schedule(XBee_Protocol.BY_NAME['RemoteATResponse'].Encode(
+                value, frame.frameid, source, source16, frame.command,
+                status), time() + self.delay)
+
+    def Discover(self, frame):
+        """
+        Answers node discovery with one response for the linked radio,
+          after `delay`.
+        """
+        peer = self.peer
+        if not peer or not frame.frameid:
+            return
+        if self.loss and self.random.random() < self.loss:
+            self.lost += 1
+            return
+        # MY, SH, SL, NI, parent, device type (router), status, profile,
+        #  manufacturer
+        node = struct.pack('>HII', peer.address, peer.address64 >> 32,
+                           peer.address64 & 0xFFFFFFFF)
+        node += peer.parameters[b'NI'] + b'\x00'
+        node += struct.pack('>HBBHH', 0xFFFE, 0x01, 0x00, 0xC105, 0x101E)
+        self.Schedule(XBee_Protocol.BY_NAME['ATResponse'].Encode(
+            node, frame.frameid, b'ND', XBee_Protocol.OK),
+            time() + self.delay)
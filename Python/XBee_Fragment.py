@@ -0,0 +1,230 @@
+"""
+Fragmentation and reassembly of messages larger than one RF packet.
+
+Each fragment starts with a three byte header: a 16 bit message ID, then
+  the fragment's index in the low 7 bits with the high bit set on the last
+  fragment.  Every other byte of the packet carries data, so a message of
+  up to 128 fragments (12KB on series 1) needs no more packets than its
+  size requires.  IDs wrap after 65536 messages, far more than can be sent
+  while a message from the same source is still being reassembled.
+
+Both ends must use this layer; a plain message isn't a valid fragment.
+"""
+import struct
+from collections import OrderedDict
+from time import time
+
+# Message ID, fragment index and last flag
+HEADER = struct.Struct('>HB')
+LAST = 0x80
+FRAGMENTS = 128
+
+
+class Reassembler():
+    """
+    Collects fragments by source address and message ID until a message
+      is complete.  Fragments may arrive in any order.
+
+    Counters:
+      completed: Messages reassembled
+      expired: Messages dropped because a fragment didn't arrive in time
+      evicted: Messages dropped to stay within `limit`
+      duplicates: Fragments received twice
+      invalid: Frames that aren't received packets, packets too short to
+        be fragments, and fragments past the last one
+      stale: Messages dropped because a fragment of another message with
+        the same ID was still waiting
+    """
+
+    def __init__(self, timeout=5.0, limit=64):
+        """
+        Inputs:
+          timeout: Seconds from a message's first fragment until it is
+            given up on
+          limit: Most messages being reassembled at once; the oldest is
+            dropped to make room
+        """
+        self.timeout = timeout
+        self.limit = limit
+        # (source, message ID): [deadline, last index, {index: data}]
+        self.pending = OrderedDict()
+        self.completed = 0
+        self.expired = 0
+        self.evicted = 0
+        self.duplicates = 0
+        self.invalid = 0
+        self.stale = 0
+
+    def __len__(self):
+        return len(self.pending)
+
+    def Expire(self, now=None):
+        """
+        Drops messages that have been incomplete for longer than `timeout`.
+
+        Outputs:
+          Number of messages dropped
+        """
+        now = time() if now is None else now
+        expired = 0
+        # Messages are kept in the order they started, so the oldest,
+        #  and first to expire, are at the front
+        for key, entry in self.pending.items():
+            if entry[0] > now:
+                break
+            expired += 1
+        for _ in range(expired):
+            self.pending.popitem(last=False)
+        self.expired += expired
+        return expired
+
+    def Add(self, frame, now=None):
+        """
+        Adds a received packet.
+
+        Inputs:
+          frame: An XBee_Frames receive frame (anything with `source` and
+            `payload`)
+
+        Outputs:
+          A (source, message) tuple once the message is complete,
+            otherwise None
+        """
+        payload = getattr(frame, 'payload', None)
+        source = getattr(frame, 'source', None)
+        if (payload is None or source is None or
+                len(payload) < HEADER.size):
+            # Not a received packet, e.g. an AT response
+            self.invalid += 1
+            return None
+
+        now = time() if now is None else now
+        self.Expire(now)
+
+        msgid, index = HEADER.unpack_from(payload)
+        last = index & LAST
+        index &= ~LAST
+        key = (source, msgid)
+
+        entry = self.pending.get(key)
+        if entry is None:
+            if last and index == 0:
+                # Fits in one packet: nothing to reassemble
+                self.completed += 1
+                return source, bytes(payload[HEADER.size:])
+            if len(self.pending) >= self.limit:
+                self.pending.popitem(last=False)
+                self.evicted += 1
+            entry = self.pending[key] = [now + self.timeout, None, {}]
+
+        parts = entry[2]
+        if index in parts:
+            self.duplicates += 1
+            return None
+        if entry[1] is not None and index > entry[1]:
+            self.invalid += 1
+            return None
+        if last:
+            if entry[1] is not None or max(parts, default=-1) > index:
+                # Fragments past this one, or a second last fragment, are
+                #  left from an older message with the same ID
+                self.stale += 1
+                del self.pending[key]
+                entry = self.pending[key] = [now + self.timeout, None, {}]
+                parts = entry[2]
+            entry[1] = index
+        parts[index] = bytes(payload[HEADER.size:])
+
+        if entry[1] is None or len(parts) != entry[1] + 1:
+            return None
+
+        del self.pending[key]
+        self.completed += 1
+        return source, b''.join(parts[i] for i in range(entry[1] + 1))
+
+
+class Fragmenter():
+    """
+    Sends and receives messages of any size, up to 128 fragments, over
+      a driver.
+
+    Send() returns what the driver's SendMany() does, so with the asyncio
+      driver it must be awaited.  Receive() works with the polling and
+      threaded drivers; with the asyncio driver, pass each received frame
+      to `reassembler.Add()` instead.
+    """
+
+    def __init__(self, driver, size=None, timeout=5.0, limit=64):
+        """
+        Inputs:
+          driver: The XBee driver to send and receive through
+          size: Optional payload bytes per packet
+            (default: the most one of the driver's packets carries)
+          timeout: Seconds to wait for all of a message's fragments
+          limit: Most messages being reassembled at once
+        """
+        self.driver = driver
+        self.size = driver.payload if size is None else size
+        self.reassembler = Reassembler(timeout, limit)
+        self.msgid = 0
+
+    def Fragments(self, msg):
+        """
+        Splits a message into packet payloads, each with its header.
+
+        Outputs:
+          A list of bytearrays
+        """
+        step = self.size - HEADER.size
+        count = max(1, -(-len(msg) // step))
+        if count > FRAGMENTS:
+            raise ValueError("Message needs {} fragments, at most {} allowed"
+                             .format(count, FRAGMENTS))
+
+        msgid = self.msgid
+        self.msgid = (msgid + 1) & 0xFFFF
+        fragments = []
+        for index in range(count):
+            fragment = bytearray(HEADER.pack(
+                msgid, index | (LAST if index == count - 1 else 0)))
+            fragment += msg[index * step:(index + 1) * step]
+            fragments.append(fragment)
+        return fragments
+
+    def Send(self, msg, addr=None, options=0x01):
+        """
+        Sends a message as back to back fragments, written all at once.
+
+        Inputs:
+          msg: A message, in bytes or bytearray format
+          addr: The 16 bit address of the destination XBee
+            (default: broadcast)
+          options: Optional byte to specify transmission options
+            (default 0x01: disable ACK)
+        Returns:
+          Number of bytes sent
+        """
+        if addr is None:
+            addr = self.driver.family.broadcast
+        return self.driver.SendMany(
+            [(addr, fragment) for fragment in self.Fragments(msg)], options)
+
+    def Receive(self, *args):
+        """
+        Receives packets from the driver until a message is complete.
+          Other frames are dropped.
+
+        Inputs:
+          Passed to the driver's Receive(), e.g. `wait` for the threaded
+            driver, which then applies to each packet
+
+        Outputs:
+          A (source, message) tuple, or None once the driver returns None
+        """
+        while True:
+            frame = self.driver.Receive(*args)
+            if frame is None:
+                return None
+            message = self.reassembler.Add(frame)
+            if message is not None:
+                return message
@@ -0,0 +1,118 @@
+"""
+Typed views of received XBee API frames.
+
+Each frame wraps the unescaped buffer produced by the decoder (MSB, LSB,
+  API type, frame data, checksum).  Fields are read straight out of that
+  buffer when accessed and payloads are memoryviews over it, so nothing is
+  copied between the serial read and the consumer.
+
+The classes are generated from the layouts in XBee_Protocol, one per
+  frame type, e.g. Rx16, ZigBeeRx, TxStatus, ATResponse.
+"""
+import struct
+import XBee_Protocol
+
+
+class Frame(object):
+    """
+    Any API frame.  Also used for API types without a dedicated class.
+
+    Indexing and len() work on the underlying buffer, so code written against
+      the plain bytearray frames (e.g. Msg[7:-1]) keeps working.
+    """
+    __slots__ = ('buffer',)
+    api_id = None
+    # Shortest buffer that holds every field
+    minimum = 0
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+
+    def __len__(self):
+        return len(self.buffer)
+
+    def __getitem__(self, key):
+        return self.buffer[key]
+
+    def __repr__(self):
+        return "{}({!r})".format(type(self).__name__, self.buffer)
+
+    @property
+    def api(self):
+        """ API identifier byte """
+        return self.buffer[2]
+
+    @property
+    def data(self):
+        """ Frame data between the API identifier and the checksum """
+        return memoryview(self.buffer)[3:-1]
+
+
+def Field(offset, code):
+    """
+    Builds a property that decodes one field when it is read.
+    """
+    if code == 'B':
+        return property(lambda self: self.buffer[offset])
+
+    unpack = struct.Struct('>' + code).unpack_from
+    return property(lambda self: unpack(self.buffer, offset)[0])
+
+
+def Payload(offset):
+    """
+    Builds a property returning a memoryview of the data after the fields.
+    """
+    return property(lambda self: memoryview(self.buffer)[offset:-1])
+
+
+def Compile(layout):
+    """
+    Generates the Frame subclass for a Layout.
+    """
+    attrs = {
+        '__slots__': (),
+        '__doc__': "0x{:02X}: {}".format(layout.api, layout.name),
+        'api_id': layout.api,
+        # The fields and the checksum
+        'minimum': layout.end + 1,
+    }
+    for name, (offset, code) in layout.offsets.items():
+        attrs[name] = Field(offset, code)
+    if layout.payload:
+        attrs['payload'] = Payload(layout.end)
+    return type(layout.name, (Frame,), attrs)
+
+
+CLASSES = dict((layout.name, Compile(layout))
+               for layout in XBee_Protocol.LAYOUTS)
+globals().update(CLASSES)
+
+# ZigBee modules don't report RSSI with each packet
+CLASSES['ZigBeeRx'].rssi = None
+
+FRAMES = dict(((family, api), CLASSES[layout.name])
+              for (family, api), layout in XBee_Protocol.BY_API.items())
+ANY_FAMILY = dict((api, CLASSES[layout.name])
+                  for (_, api), layout in XBee_Protocol.BY_API.items())
+
+
+def Parse(buffer, family=None):
+    """
+    Wraps an unescaped frame buffer in the class for its API type.
+      No fields are decoded until they are accessed.
+
+    Inputs:
+      buffer: A bytearray containing MSB, LSB, API type, frame data, checksum
+      family: Optional module family (XBee_Protocol.SERIES1 or SERIES2)
+        the frame came from
+
+    Outputs:
+      A Frame object; a plain Frame if the buffer is too short to hold
+        the fields of its API type
+    """
+    api = buffer[2]
+    cls = FRAMES.get((family, api)) or ANY_FAMILY.get(api, Frame)
+    if len(buffer) < cls.minimum:
+        return Frame(buffer)
+    return cls(buffer)
@@ -0,0 +1,115 @@
+import os
+import queue
+import selectors
+import threading
+
+
+class RadioManager(threading.Thread):
+    """
+    Services any number of polling XBee drivers (XBee.XBee or
+      XBee_series_2.XBee) from one thread blocked in a single selectors
+      loop, instead of one reader thread per port.
+
+    Received messages from every radio go onto one queue, tagged with
+      the port they arrived on.  Needs serial ports with selectable file
+      descriptors, i.e. POSIX serial devices or ptys.
+    """
+    # Longest the loop waits before expiring timed out frame IDs
+    wait = 0.1
+
+    def __init__(self):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.selector = selectors.DefaultSelector()
+        self.radios = {}
+        self.RxQ = queue.Queue()
+        self.stop = threading.Event()
+        self.lock = threading.Lock()
+        # Wakes the loop when radios are added or removed
+        self.wakeup, self.waker = os.pipe()
+        self.selector.register(self.wakeup, selectors.EVENT_READ, None)
+        self.start()
+
+    def Add(self, radio, port=None):
+        """
+        Starts servicing a radio.  From then on read its messages from the
+          manager's Receive(), not the radio's.
+
+        Inputs:
+          radio: A polling XBee driver
+          port: Optional tag for the radio's messages
+            (default: the name of its serial port)
+        """
+        port = radio.serial.port if port is None else port
+        with self.lock:
+            self.radios[radio] = port
+            self.selector.register(radio.serial.fileno(),
+                                   selectors.EVENT_READ, radio)
+        os.write(self.waker, b'\x00')
+
+    def Remove(self, radio):
+        """
+        Stops servicing a radio.  Messages it already received stay queued.
+        """
+        with self.lock:
+            if self.radios.pop(radio, None) is None:
+                return
+            self.selector.unregister(radio.serial.fileno())
+        os.write(self.waker, b'\x00')
+
+    def shutdown(self):
+        self.stop.set()
+        os.write(self.waker, b'\x00')
+        self.join()
+        self.selector.close()
+        os.close(self.wakeup)
+        os.close(self.waker)
+
+    def run(self):
+        while not self.stop.is_set():
+            self.Poll(self.wait)
+
+    def Poll(self, timeout=0):
+        """
+        Waits up to `timeout` seconds for any radio to have bytes waiting,
+          then reads and queues everything received.
+
+        Outputs:
+          Number of messages queued
+        """
+        queued = 0
+        for key, _ in self.selector.select(timeout):
+            radio = key.data
+            if radio is None:
+                os.read(self.wakeup, 512)
+                continue
+
+            with self.lock:
+                port = self.radios.get(radio)
+            if port is None:
+                continue
+
+            radio.Rx()
+            while radio.RxMessages:
+                self.RxQ.put((port, radio.Next()))
+                queued += 1
+
+        with self.lock:
+            radios = list(self.radios)
+        for radio in radios:
+            radio.tracker.Expire()
+        return queued
+
+    def Receive(self, wait=5):
+        """
+        Checks the shared receive queue for messages
+
+        Inputs:
+            wait(optional): Desired number of seconds to wait for a message
+        Output:
+            A (port, message) tuple, if received.  None if timed out.
+        """
+        try:
+            return self.RxQ.get(timeout=wait)
+        except queue.Empty:
+            return None
@@ -0,0 +1,157 @@
+"""
+Optional runtime metrics for the drivers.
+
+Drivers take a `metrics` object and skip all measurement when it is None,
+  which is the default.  The decoder's own counters (checksum failures,
+  length errors, discarded bytes, escapes) are plain integers that are
+  always kept; Snapshot() gathers them together with what Metrics records.
+
+Times are recorded in microseconds.
+"""
+from collections import Counter, deque
+from time import perf_counter
+
+
+class Histogram():
+    """
+    Counts values in power-of-two buckets: bucket 0 holds 0, bucket n
+      holds values from 2**(n-1) up to 2**n - 1.
+    """
+    __slots__ = ('scale', 'buckets', 'count', 'total', 'high')
+
+    def __init__(self, scale=1):
+        """
+        Inputs:
+          scale: Multiplier applied to each value before it is counted,
+            e.g. 1e6 to record seconds as microseconds
+        """
+        self.scale = scale
+        self.buckets = [0] * 64
+        self.count = 0
+        self.total = 0
+        self.high = 0
+
+    def Add(self, value):
+        value = int(value * self.scale)
+        self.buckets[min(value.bit_length(), 63)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.high:
+            self.high = value
+
+    def Percentile(self, p):
+        """
+        Outputs:
+          Upper bound of the bucket holding the p-th fraction of the values
+        """
+        rank = p * self.count
+        seen = 0
+        for n, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= rank:
+                return min((1 << n) - 1, self.high)
+        return 0
+
+    def Summary(self):
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0,
+            'p50': self.Percentile(0.5),
+            'p90': self.Percentile(0.9),
+            'p99': self.Percentile(0.99),
+            'max': self.high,
+        }
+
+
+class Metrics():
+    """
+    Counters and histograms for one driver.
+
+    Counters:
+      rx: Frames received, by API identifier
+      tx: Frames sent, by API identifier
+      sent: Bytes written to serial, escaped
+    Histograms:
+      reads: Bytes per serial read
+      decode: Microseconds to decode each read
+      parse: Microseconds to parse each frame
+      wait: Microseconds each message waited in the receive queue
+    """
+
+    def __init__(self, hook=None):
+        """
+        Inputs:
+          hook: Optional function called as hook(stage, seconds) for every
+            stage of the receive path: 'decode' once per serial read,
+            'parse' and 'deliver' once per frame
+        """
+        self.hook = hook
+        self.rx = Counter()
+        self.tx = Counter()
+        self.sent = 0
+        self.reads = Histogram()
+        self.decode = Histogram(1e6)
+        self.parse = Histogram(1e6)
+        self.wait = Histogram(1e6)
+        # When each message still in a FIFO receive queue was queued
+        self.stamps = deque()
+        self.high = 0
+
+    def Sent(self, api, frames, nbytes):
+        self.tx[api] += frames
+        self.sent += nbytes
+
+    def Queued(self):
+        """
+        Notes that a message went onto a FIFO receive queue.
+        """
+        self.stamps.append(perf_counter())
+        if len(self.stamps) > self.high:
+            self.high = len(self.stamps)
+
+    def Dequeued(self):
+        """
+        Notes that the oldest message came off a FIFO receive queue.
+        """
+        if self.stamps:
+            self.wait.Add(perf_counter() - self.stamps.popleft())
+
+    def Snapshot(self, driver):
+        """
+        Gathers every counter for a driver.
+
+        Inputs:
+          driver: The driver these metrics are attached to
+
+        Outputs:
+          A dictionary of counters and histogram summaries
+        """
+        decoders = [driver.decoder, driver.validator]
+        total = lambda name: sum(getattr(d, name) for d in decoders)
+        snapshot = {
+            'rx': dict(("0x{:02X}".format(api), n)
+                       for api, n in self.rx.items()),
+            'tx': dict(("0x{:02X}".format(api), n)
+                       for api, n in self.tx.items()),
+            'bytes read': self.reads.total,
+            'bytes sent': self.sent,
+            'frames decoded': total('frames'),
+            'checksum errors': total('checksums'),
+            'length errors': total('lengths'),
+            'resyncs': total('resyncs'),
+            'discarded bytes': total('discarded'),
+            'escapes': total('escaped'),
+            'reads': self.reads.Summary(),
+            'decode us': self.decode.Summary(),
+            'parse us': self.parse.Summary(),
+            'wait us': self.wait.Summary(),
+        }
+
+        queue = getattr(driver, 'RxQ', None)
+        if queue is None:
+            queue = getattr(driver, 'RxMessages', ())
+        snapshot['queue depth'] = (queue.qsize() if hasattr(queue, 'qsize')
+                                   else len(queue))
+        snapshot['queue high'] = getattr(queue, 'high', self.high)
+        snapshot['queue dropped'] = getattr(queue, 'dropped', 0)
+        return snapshot
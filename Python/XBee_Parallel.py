@@ -0,0 +1,170 @@
+"""
+Decodes capture archives on every core, for reprocessing more traffic than
+  one process can get through.
+
+Each capture file is split into spans of whole records.  A worker decodes
+  its span starting at the first start delimiter in it; any bytes before
+  that belong to the previous span's last frame.  Past the end of its span
+  it keeps going only as far as the next start delimiter, to finish the
+  frame it was in the middle of.  Every frame is decoded by the one worker
+  whose span holds its start delimiter, so none are lost or decoded twice
+  at the boundaries.
+
+Frames are checked as Core.Validate() checks them: a Decoder checks the
+  length and checksum, and a frame cut short by the next start delimiter is
+  counted as a length error.
+
+Usage:
+  python XBee_Parallel.py capture.xbc [capture.xbc ...]
+    Decodes captures on all cores and prints what they held
+"""
+import heapq
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+from XBee_Capture import HEADER, RECORD, Replay
+from XBee_Decoder import Decoder
+
+# Bytes of records per span
+SPAN = 1 << 22
+COUNTERS = ('frames', 'resyncs', 'checksums', 'lengths', 'discarded')
+
+
+def Split(path, size=SPAN):
+    """
+    Splits a capture file into spans of whole records.
+
+    Outputs:
+      A list of (start, stop) file offsets
+    """
+    with Replay(path) as capture:
+        data = capture.map
+        end = len(data)
+        spans = []
+        first = pos = HEADER.size
+        while pos + RECORD.size <= end:
+            pos += RECORD.size + RECORD.unpack_from(data, pos)[1]
+            if pos - first >= size:
+                spans.append((first, min(pos, end)))
+                first = pos
+        if first < end:
+            spans.append((first, end))
+    return spans
+
+
+def Decode(path, start, stop):
+    """
+    Decodes the frames starting in one span of a capture file.  Runs in a
+      worker process.
+
+    Outputs:
+      A list of (wall clock time, frame), each stamped with when the
+        chunk completing it was read, and a dict of the Decoder's counters
+    """
+    frames = []
+    decoder = Decoder()
+    # Bytes before the first start delimiter are the previous span's
+    leading = start > HEADER.size
+    with Replay(path) as capture:
+        for pos, stamp, chunk in capture.Records(start):
+            after = pos >= stop
+            if leading:
+                if after:
+                    break
+                first = chunk.find(b'\x7E')
+                if first < 0:
+                    continue
+                chunk = chunk[first:]
+                leading = False
+
+            # Past the span, only go as far as the next start delimiter
+            end = chunk.find(b'\x7E') if after else -1
+            if end >= 0:
+                chunk = chunk[:end]
+            stamp += capture.started
+            for frame in decoder.Feed(chunk):
+                frames.append((stamp, bytes(frame)))
+
+            if end >= 0:
+                if decoder.state == Decoder.FRAME:
+                    # Cut short by that delimiter, as the Decoder counts it
+                    decoder.resyncs += 1
+                    decoder.lengths += 1
+                    decoder.discarded += len(decoder.raw) + 1
+                break
+    counters = dict((name, getattr(decoder, name)) for name in COUNTERS)
+    return frames, counters
+
+
+class ParallelDecoder():
+    """
+    Decodes capture files in a pool of worker processes.
+
+    Counters, totals over everything decoded:
+      frames, resyncs, checksums, lengths, discarded: As for a Decoder
+    """
+
+    def __init__(self, workers=None, size=SPAN):
+        """
+        Inputs:
+          workers: Optional number of worker processes
+            (default: one per core)
+          size: Bytes of records each worker decodes at a time
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.size = size
+        for name in COUNTERS:
+            setattr(self, name, 0)
+
+    def File(self, pool, path, window):
+        """
+        Yields the frames of one capture file in order, keeping at most
+          `window` spans in flight.
+        """
+        pending = deque()
+        spans = iter(Split(path, self.size))
+        while True:
+            for start, stop in spans:
+                pending.append(pool.submit(Decode, path, start, stop))
+                if len(pending) >= window:
+                    break
+            if not pending:
+                return
+            frames, counters = pending.popleft().result()
+            for name, value in counters.items():
+                setattr(self, name, getattr(self, name) + value)
+            for frame in frames:
+                yield frame
+
+    def Decode(self, *paths):
+        """
+        Decodes capture files, such as those of several gateways or of
+          consecutive days.
+
+        Outputs:
+          A generator of (wall clock time, frame), in time order across
+            all files.  Frames are unescaped and minus the start
+            delimiter, as a Decoder returns them.
+        """
+        window = max(2, 2 * self.workers // max(1, len(paths)))
+        with ProcessPoolExecutor(self.workers) as pool:
+            files = [self.File(pool, path, window) for path in paths]
+            for frame in heapq.merge(*files, key=lambda f: f[0]):
+                yield frame
+
+
+if __name__ == "__main__":
+    decoder = ParallelDecoder()
+    size = sum(os.path.getsize(path) for path in sys.argv[1:])
+    start = perf_counter()
+    frames = sum(1 for _ in decoder.Decode(*sys.argv[1:]))
+    elapsed = perf_counter() - start
+
+    print("{} frames, {} checksum errors, {} length errors, "
+          "{} bytes discarded".format(frames, decoder.checksums,
+                                      decoder.lengths, decoder.discarded))
+    print("Decoded {} bytes with {} workers in {:.3f}s: {:.2f} MB/s, "
+          "{:.0f} frames/s".format(size, decoder.workers, elapsed,
+                                   size / elapsed / 1e6, frames / elapsed))
@@ -0,0 +1,241 @@
+"""
+Cached reads and writes of XBee AT parameters, local and remote.
+
+Reading a parameter from another node means a round trip over the air, and
+  most of them (addresses, channel, PAN ID) rarely change.  Parameters
+  keeps every value read or written for `ttl` seconds, so reading it again
+  needs no radio traffic at all.  Reads of many parameters, or of many
+  nodes, are all sent before waiting on any response, each with its own
+  frame ID.
+
+Nodes are named by address: None for the local XBee, an int of 0xFFFF or
+  less for a 16 bit address, anything larger for a 64 bit address.  Values
+  are bytes as the XBee returns them, e.g. int.from_bytes(value, 'big') for
+  MY or CH.
+"""
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from time import sleep, time
+import XBee_Protocol
+
+LOCAL = None
+
+
+class ATError(RuntimeError):
+    """
+    An AT command the XBee answered with an error status.
+    """
+
+    def __init__(self, node, command, status):
+        RuntimeError.__init__(self, "AT{} on {} failed with status {}".format(
+            command.decode('ascii', 'replace'),
+            'local XBee' if node is LOCAL else '0x{:X}'.format(node), status))
+        self.node = node
+        self.command = command
+        self.status = status
+
+
+class Parameters():
+    """
+    AT parameter cache over one driver.
+
+    Works with the polling and threaded drivers.  With the polling driver,
+      waiting on a response reads serial, so frames other than responses
+      received meanwhile are queued in RxMessages as usual.
+
+    Counters:
+      hits: Reads answered from the cache
+      misses: Reads sent to an XBee
+      errors: Commands that failed or timed out
+    """
+
+    def __init__(self, driver, ttl=300.0, timeout=None, window=32):
+        """
+        Inputs:
+          driver: The XBee driver to send commands through
+          ttl: Seconds a value is kept
+          timeout: Optional number of seconds to wait for each response
+            (default: the driver's tracker timeout)
+          window: Most commands waiting on a response at once
+        """
+        self.driver = driver
+        self.ttl = ttl
+        self.timeout = timeout
+        self.window = window
+        # (node, command): (expiry time, value)
+        self.cache = {}
+        self.lock = threading.Lock()
+        self.polling = hasattr(driver, 'RxMessages')
+
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def Get(self, node, command, now=None):
+        """
+        Outputs:
+          The cached value, or None if it isn't cached or has expired
+        """
+        now = time() if now is None else now
+        with self.lock:
+            entry = self.cache.get((node, command))
+            if entry is None:
+                return None
+            if entry[0] <= now:
+                del self.cache[(node, command)]
+                return None
+            return entry[1]
+
+    def Put(self, node, command, value, ttl=None):
+        """
+        Caches a value, e.g. one learned some other way.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        with self.lock:
+            self.cache[(node, command)] = (time() + ttl, bytes(value))
+
+    def Invalidate(self, node=LOCAL, command=None):
+        """
+        Drops one cached parameter of a node, or all of them if `command`
+          is None.
+        """
+        with self.lock:
+            if command is not None:
+                self.cache.pop((node, command), None)
+                return
+            for key in [k for k in self.cache if k[0] == node]:
+                del self.cache[key]
+
+    def clear(self):
+        """ Drops every cached parameter of every node """
+        with self.lock:
+            self.cache.clear()
+
+    def Command(self, node, command, parameter=b''):
+        """
+        Sends one AT command, without looking at the cache.
+
+        Outputs:
+          A concurrent.futures.Future that resolves to the value returned,
+            or fails with an ATError or TimeoutError
+        """
+        if node is LOCAL:
+            response = self.driver.SendAT(command, parameter,
+                                          timeout=self.timeout)
+        elif node > 0xFFFF:
+            response = self.driver.SendRemoteAT(
+                command, addr64=node, parameter=parameter,
+                timeout=self.timeout)
+        else:
+            response = self.driver.SendRemoteAT(
+                command, addr=node, parameter=parameter, timeout=self.timeout)
+
+        result = Future()
+
+        def Done(response):
+            try:
+                frame = response.result()
+            except Exception as exc:
+                self.errors += 1
+                result.set_exception(exc)
+                return
+            if frame.status != XBee_Protocol.OK:
+                self.errors += 1
+                result.set_exception(ATError(node, command, frame.status))
+                return
+            value = bytes(frame.payload)
+            if parameter:
+                value = bytes(parameter)
+            self.Put(node, command, value)
+            result.set_result(value)
+
+        response.add_done_callback(Done)
+        return result
+
+    def Query(self, command, node=LOCAL):
+        """
+        Reads a parameter from the cache, or from the XBee if it isn't
+          cached.
+
+        Outputs:
+          A concurrent.futures.Future that resolves to the value
+        """
+        value = self.Get(node, command)
+        if value is not None:
+            self.hits += 1
+            result = Future()
+            result.set_result(value)
+            return result
+        self.misses += 1
+        return self.Command(node, command)
+
+    def Read(self, command, node=LOCAL):
+        """
+        Reads a parameter, from the cache if possible.
+
+        Outputs:
+          The value.  Raises ATError if the XBee returned an error, or
+            TimeoutError if it didn't respond.
+        """
+        future = self.Query(command, node)
+        self.Wait([future])
+        return future.result()
+
+    def ReadMany(self, commands, nodes=(LOCAL,)):
+        """
+        Reads every parameter of every node, keeping up to `window`
+          commands that aren't cached in flight instead of waiting on each
+          response in turn.
+
+        Inputs:
+          commands: Two letter commands, e.g. (b'SH', b'SL')
+          nodes: Node addresses
+
+        Outputs:
+          A dict of {(node, command): value}; failed reads hold their
+            ATError or TimeoutError instead
+        """
+        futures = {}
+        for node in nodes:
+            for command in commands:
+                pending = [f for f in futures.values() if not f.done()]
+                if len(pending) >= self.window:
+                    self.Wait(pending, 1)
+                futures[(node, command)] = self.Query(command, node)
+        self.Wait(list(futures.values()))
+
+        results = {}
+        for key, future in futures.items():
+            exc = future.exception()
+            results[key] = future.result() if exc is None else exc
+        return results
+
+    def Write(self, command, value, node=LOCAL):
+        """
+        Sets a parameter and caches the new value once the XBee accepts it.
+          Remote changes are applied right away.
+
+        Outputs:
+          The value.  Raises ATError or TimeoutError as Read() does.
+        """
+        self.Invalidate(node, command)
+        future = self.Command(node, command, value)
+        self.Wait([future])
+        return future.result()
+
+    def Wait(self, futures, count=None):
+        """
+        Waits until `count` of the futures (default: all of them) are done.
+          With the polling driver, reads serial meanwhile so the responses
+          arrive.
+        """
+        count = len(futures) if count is None else count
+        while True:
+            pending = [f for f in futures if not f.done()]
+            if len(futures) - len(pending) >= count:
+                return
+            if self.polling:
+                self.driver.Rx()
+                sleep(0.001)
+            else:
+                wait(pending, return_when=FIRST_COMPLETED)
@@ -0,0 +1,213 @@
+"""
+Table of XBee API frame layouts for both module families, and the
+  encoders and decoders compiled from it.
+
+Every frame type is declared once in LAYOUTS: its API identifier, the
+  families that use it, the fixed fields that follow the API identifier
+  and whether a payload comes after them.  From that, each Layout packs
+  outgoing frames with one precompiled struct and knows the offset of every
+  field in a received frame (see XBee_Frames).  A Family bundles what the
+  drivers need to know about series 1 or series 2 modules, so the drivers
+  themselves contain no frame layouts at all.
+"""
+import struct
+from XBee_Codec import EscapeFrame
+
+
+class Layout():
+    """
+    One API frame type.
+    """
+
+    def __init__(self, api, name, families, fields, payload=False):
+        """
+        Inputs:
+          api: API identifier byte
+          name: Name of the frame type, also used for its XBee_Frames class
+          families: Names of the module families that use this frame type
+          fields: Sequence of (name, struct format) for the fields after the
+            API identifier, in frame order
+          payload: True if variable length data follows the fields
+        """
+        self.api = api
+        self.name = name
+        self.families = families
+        self.fields = fields
+        self.payload = payload
+
+        # Start delimiter, length and API identifier, then the fields
+        self.header = struct.Struct('>BHB' + ''.join(c for _, c in fields))
+        self.size = self.header.size
+
+        # Offsets in an unescaped frame as the decoder returns it, which
+        #  starts at the length MSB rather than the start delimiter
+        self.offsets = {}
+        offset = 3
+        for field, code in fields:
+            self.offsets[field] = (offset, code)
+            offset += struct.calcsize('>' + code)
+        self.end = offset
+
+    def Encode(self, msg, *values):
+        """
+        Packs a complete, escaped frame.
+
+        Inputs:
+          msg: Payload, in bytes or bytearray format
+          values: A value for every field, in frame order
+
+        Outputs:
+          A bytearray ready to be written to serial
+        """
+        frame = bytearray(self.size + len(msg) + 1)
+        self.header.pack_into(frame, 0, 0x7E, self.size - 3 + len(msg),
+                              self.api, *values)
+        frame[self.size:-1] = msg
+        frame[-1] = 0xFF - (sum(frame[3:-1]) & 0xFF)
+        return EscapeFrame(frame)
+
+    def Encoder(self, order, **defaults):
+        """
+        Compiles a function that builds this frame type from keyword
+          arguments, e.g. Tx16(msg, addr=0x0001).
+
+        Inputs:
+          order: Field names in the order they may be passed positionally
+            after the payload.  Remaining fields follow in frame order.
+          defaults: A default value for every field except those that
+            must always be given, which must come first in `order`
+
+        Outputs:
+          A function taking the payload and the fields, returning an escaped
+            frame
+        """
+        names = list(order) + [f for f, _ in self.fields if f not in order]
+        source = "def {}(msg, {}):\n    return Encode(msg, {})\n".format(
+            self.name,
+            ", ".join("{}={!r}".format(n, defaults[n]) if n in defaults
+                      else n for n in names),
+            ", ".join(f for f, _ in self.fields))
+        namespace = {'Encode': self.Encode}
+        exec(source, namespace)
+        encode = namespace[self.name]
+        encode.__doc__ = "Builds an escaped {} (0x{:02X}) frame".format(
+            self.name, self.api)
+        encode.api = self.api
+        return encode
+
+
+SERIES1 = '802.15.4'
+SERIES2 = 'ZigBee'
+BOTH = (SERIES1, SERIES2)
+
+LAYOUTS = (
+    # Transmit requests
+    Layout(0x00, 'Tx64', (SERIES1,),
+           (('frameid', 'B'), ('addr', 'Q'), ('options', 'B')), True),
+    Layout(0x01, 'Tx16', (SERIES1,),
+           (('frameid', 'B'), ('addr', 'H'), ('options', 'B')), True),
+    Layout(0x10, 'ZigBeeTx', (SERIES2,),
+           (('frameid', 'B'), ('addr64', 'Q'), ('addr', 'H'),
+            ('radius', 'B'), ('options', 'B')), True),
+
+    # AT commands, to the local module or (0x17) a remote one
+    Layout(0x08, 'ATCommand', BOTH,
+           (('frameid', 'B'), ('command', '2s')), True),
+    Layout(0x09, 'ATQueue', BOTH,
+           (('frameid', 'B'), ('command', '2s')), True),
+    Layout(0x17, 'RemoteAT', BOTH,
+           (('frameid', 'B'), ('addr64', 'Q'), ('addr', 'H'),
+            ('options', 'B'), ('command', '2s')), True),
+
+    # Received packets
+    Layout(0x80, 'Rx64', (SERIES1,),
+           (('source', 'Q'), ('rssi', 'B'), ('options', 'B')), True),
+    Layout(0x81, 'Rx16', (SERIES1,),
+           (('source', 'H'), ('rssi', 'B'), ('options', 'B')), True),
+    Layout(0x90, 'ZigBeeRx', (SERIES2,),
+           (('source', 'Q'), ('source16', 'H'), ('options', 'B')), True),
+
+    # Status and responses
+    Layout(0x88, 'ATResponse', BOTH,
+           (('frameid', 'B'), ('command', '2s'), ('status', 'B')), True),
+    Layout(0x89, 'TxStatus', (SERIES1,),
+           (('frameid', 'B'), ('status', 'B'))),
+    Layout(0x8B, 'ZigBeeTxStatus', (SERIES2,),
+           (('frameid', 'B'), ('destination', 'H'), ('retries', 'B'),
+            ('status', 'B'), ('discovery', 'B'))),
+    Layout(0x97, 'RemoteATResponse', BOTH,
+           (('frameid', 'B'), ('source', 'Q'), ('source16', 'H'),
+            ('command', '2s'), ('status', 'B')), True),
+)
+
+BY_NAME = dict((layout.name, layout) for layout in LAYOUTS)
+BY_API = dict(((family, layout.api), layout)
+              for layout in LAYOUTS for family in layout.families)
+
+Tx16 = BY_NAME['Tx16'].Encoder(
+    ('addr', 'options', 'frameid'), addr=0xFFFF, options=0x01, frameid=0x00)
+Tx64 = BY_NAME['Tx64'].Encoder(
+    ('addr', 'options', 'frameid'), addr=0xFFFF, options=0x01, frameid=0x00)
+ZigBeeTx = BY_NAME['ZigBeeTx'].Encoder(
+    ('addr', 'options', 'frameid'), addr=0xFFFE, options=0x01, frameid=0x00,
+    addr64=0xFFFF, radius=0x00)
+
+# The parameter, if any, is the payload.  Remote commands go to `addr64`
+#  unless it is UNKNOWN, then to the 16 bit `addr`; USE_64 is the 16 bit
+#  address that says to use `addr64`.
+UNKNOWN = 0xFFFFFFFFFFFFFFFF
+USE_64 = 0xFFFE
+ATCommand = BY_NAME['ATCommand'].Encoder(('command', 'frameid'),
+                                         frameid=0x00)
+ATQueue = BY_NAME['ATQueue'].Encoder(('command', 'frameid'), frameid=0x00)
+# Options 0x02: apply changes right away
+RemoteAT = BY_NAME['RemoteAT'].Encoder(
+    ('command', 'addr', 'addr64', 'options', 'frameid'), addr=USE_64,
+    addr64=UNKNOWN, options=0x02, frameid=0x00)
+
+# AT command response status codes
+OK = 0x00
+ERROR = 0x01
+INVALID_COMMAND = 0x02
+INVALID_PARAMETER = 0x03
+# Remote commands only: no response from the remote module
+TX_FAILURE = 0x04
+
+
+class Family():
+    """
+    What a driver needs to know about one family of XBee modules.
+    """
+
+    def __init__(self, name, tx, broadcast, payload, tx64, network=False):
+        """
+        Inputs:
+          name: SERIES1 or SERIES2
+          tx: Encoder used by Send, taking (msg, addr, options, frameid)
+          broadcast: 16 bit broadcast address, Send's default destination
+          payload: Most payload bytes one RF packet carries
+          tx64: Encoder used by Send for 64 bit destinations, taking
+            (msg, addr, options, frameid), plus addr64 if `network`
+          network: True if 16 bit addresses are network addresses the
+            mesh assigns, which have to be learned
+        """
+        self.name = name
+        self.Tx = tx
+        self.broadcast = broadcast
+        self.payload = payload
+        self.Tx64 = tx64
+        self.network = network
+
+    def Layout(self, api):
+        """
+        Outputs:
+          The Layout of an API frame type in this family, or None
+        """
+        return BY_API.get((self.name, api))
+
+
+FAMILIES = {
+    SERIES1: Family(SERIES1, Tx16, 0xFFFF, 100, Tx64),
+    # Without encryption or source routing, which reduce it further
+    SERIES2: Family(SERIES2, ZigBeeTx, 0xFFFE, 84, ZigBeeTx, network=True),
+}
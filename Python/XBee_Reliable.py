@@ -0,0 +1,371 @@
+"""
+Reliable, in-order delivery over the radio's unreliable packets.
+
+Each peer gets a sliding window of numbered segments: up to `window`
+  segments are in flight at once instead of waiting for each to be
+  acknowledged.  The receiver acknowledges cumulatively (the next segment
+  it expects) and selectively (a bitmap of the segments after that which
+  it already holds), so only segments that were actually lost are sent
+  again.  Retransmit timeouts adapt to the measured round trip time as in
+  RFC 6298, and duplicates are suppressed at the receiver.
+
+Packets:
+  DATA: 'D', sequence number (16 bits), data
+  ACK:  'A', next expected sequence number (16 bits),
+        bitmap of the 32 sequence numbers after it (32 bits)
+
+Both ends must use this layer.
+"""
+import struct
+from collections import OrderedDict, deque
+from time import sleep, time
+
+DATA = 0x44
+ACK = 0x41
+DATA_HEADER = struct.Struct('>BH')
+ACK_PACKET = struct.Struct('>BHI')
+
+# The selective acknowledgement bitmap covers this many segments
+WINDOW = 32
+
+
+def Distance(a, b):
+    """ How far sequence number `a` is ahead of `b`, modulo 2**16 """
+    return (a - b) & 0xFFFF
+
+
+class Segment():
+    __slots__ = ('data', 'sent', 'deadline', 'retransmitted', 'sacked')
+
+    def __init__(self, data):
+        self.data = data
+        self.sent = 0.0
+        self.deadline = 0.0
+        self.retransmitted = False
+        self.sacked = False
+
+
+class Peer():
+    """
+    Send and receive state for one remote address.
+    """
+
+    def __init__(self, initial):
+        # Sending
+        self.next = 0
+        self.base = 0
+        self.flight = OrderedDict()
+        self.queue = deque()
+        self.srtt = None
+        self.rttvar = None
+        self.rto = initial
+        self.dupacks = 0
+        # Receiving
+        self.expected = 0
+        self.held = {}
+        self.ack = False
+
+
+class Reliable():
+    """
+    Reliable streams to any number of peers over one driver.
+
+    Works with the polling and threaded drivers.  Everything happens in
+      Poll(), which Receive() and flush() call, so call one of them
+      regularly; nothing is retransmitted otherwise.
+
+    Counters:
+      sent: Segments sent for the first time
+      retransmits: Segments sent again
+      timeouts: Retransmit timer expiries
+      duplicates: Segments received more than once
+      invalid: Packets that aren't part of a reliable stream
+    """
+
+    def __init__(self, driver, window=8, options=0x01, initial=1.0,
+                 minimum=0.05, maximum=5.0):
+        """
+        Inputs:
+          driver: The XBee driver to send and receive through
+          window: Most unacknowledged segments per peer, up to 32
+          options: Transmission options for every packet
+            (default 0x01: no MAC acknowledgement, this layer does it)
+          initial: Retransmit timeout in seconds before any round trip has
+            been measured
+          minimum, maximum: Bounds of the retransmit timeout
+        """
+        if not 0 < window <= WINDOW:
+            raise ValueError("Window must be 1 to {}".format(WINDOW))
+        self.driver = driver
+        self.window = window
+        self.options = options
+        self.initial = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.size = driver.payload - DATA_HEADER.size
+        self.peers = {}
+        self.delivered = deque()
+        self.polling = hasattr(driver, 'RxMessages')
+
+        self.sent = 0
+        self.retransmits = 0
+        self.timeouts = 0
+        self.duplicates = 0
+        self.invalid = 0
+
+    def Peer(self, addr):
+        peer = self.peers.get(addr)
+        if peer is None:
+            peer = self.peers[addr] = Peer(self.initial)
+        return peer
+
+    def Send(self, data, addr):
+        """
+        Queues data for reliable delivery, split into segments that each
+          fit in one packet, and sends as much as the window allows.
+
+        Inputs:
+          data: bytes or bytearray
+          addr: 16 bit address of the destination XBee, or on series 2
+            its 64 bit address; its packets are filed under the same one
+
+        Outputs:
+          Number of segments queued
+        """
+        peer = self.Peer(addr)
+        segments = [data[i:i + self.size]
+                    for i in range(0, len(data), self.size)] or [b'']
+        peer.queue.extend(bytes(s) for s in segments)
+        self.Transmit(addr, peer, time())
+        return len(segments)
+
+    def Unacknowledged(self, addr=None):
+        """
+        Outputs:
+          Number of segments not yet acknowledged, for one peer or all
+        """
+        peers = self.peers.values() if addr is None else [self.Peer(addr)]
+        return sum(len(p.flight) + len(p.queue) for p in peers)
+
+    def Receive(self, wait=5):
+        """
+        Waits for the next segment delivered in order, from any peer.
+
+        Outputs:
+          A (source, data) tuple, or None if `wait` seconds passed
+        """
+        deadline = time() + wait
+        while not self.delivered:
+            remaining = deadline - time()
+            if remaining <= 0:
+                return None
+            self.Poll(remaining)
+        return self.delivered.popleft()
+
+    def flush(self, timeout=None):
+        """
+        Keeps polling until every segment sent has been acknowledged.
+
+        Outputs:
+          False if the timeout expired first
+        """
+        deadline = None if timeout is None else time() + timeout
+        while self.Unacknowledged():
+            remaining = self.maximum if deadline is None else deadline - time()
+            if remaining <= 0:
+                return False
+            self.Poll(remaining)
+        return True
+
+    def Poll(self, wait=0):
+        """
+        Handles received packets, sends acknowledgements, retransmits what
+          has timed out and sends what the windows now allow.
+
+        Inputs:
+          wait: Most seconds to wait for a packet; less if a retransmit
+            is due sooner
+        """
+        now = time()
+        due = [s.deadline for p in self.peers.values()
+               for s in p.flight.values() if not s.sacked]
+        if due:
+            wait = max(0, min(wait, min(due) - now))
+
+        frame = self.Next(wait)
+        while frame is not None:
+            self.Handle(frame)
+            frame = self.Next(0)
+
+        now = time()
+        for addr, peer in self.peers.items():
+            if peer.ack:
+                peer.ack = False
+                self.Acknowledge(addr, peer)
+            self.Retransmit(addr, peer, now)
+            self.Transmit(addr, peer, now)
+
+    def Next(self, wait):
+        """ Gets a frame from the driver, waiting up to `wait` seconds """
+        if not self.polling:
+            return self.driver.Receive(wait)
+
+        deadline = time() + wait
+        while True:
+            frame = self.driver.Receive()
+            if frame is not None or time() >= deadline:
+                return frame
+            sleep(0.001)
+
+    def Handle(self, frame):
+        payload = getattr(frame, 'payload', None)
+        source = getattr(frame, 'source', None)
+        if (payload is None or source is None or
+                len(payload) < DATA_HEADER.size):
+            # Not a received packet, e.g. a late AT response
+            self.invalid += 1
+            return
+
+        addr = self.Address(frame, source)
+        if payload[0] == DATA:
+            self.Data(addr, payload)
+        elif payload[0] == ACK and len(payload) >= ACK_PACKET.size:
+            self.Ack(addr, payload)
+        else:
+            self.invalid += 1
+
+    def Address(self, frame, source):
+        """
+        Outputs:
+          The address a received packet's peer is filed under: series 2
+            packets carry both addresses, so whichever Send() used, and
+            the 64 bit address, which doesn't change, for a new peer
+        """
+        source16 = getattr(frame, 'source16', None)
+        if (source16 is not None and source not in self.peers and
+                source16 in self.peers):
+            return source16
+        return source
+
+    def Data(self, addr, payload):
+        """
+        Holds a received segment until everything before it has arrived,
+          then delivers it.
+        """
+        peer = self.Peer(addr)
+        peer.ack = True
+        _, seq = DATA_HEADER.unpack_from(payload)
+        ahead = Distance(seq, peer.expected)
+        if ahead >= WINDOW or seq in peer.held:
+            # Already delivered, or held: our acknowledgement was lost
+            self.duplicates += 1
+            return
+
+        peer.held[seq] = bytes(payload[DATA_HEADER.size:])
+        while peer.expected in peer.held:
+            self.delivered.append((addr, peer.held.pop(peer.expected)))
+            peer.expected = (peer.expected + 1) & 0xFFFF
+
+    def Acknowledge(self, addr, peer):
+        bitmap = 0
+        for seq in peer.held:
+            bitmap |= 1 << (Distance(seq, peer.expected) - 1)
+        self.driver.Send(ACK_PACKET.pack(ACK, peer.expected, bitmap), addr,
+                         self.options)
+
+    def Ack(self, addr, payload):
+        """
+        Releases acknowledged segments and measures the round trip time.
+        """
+        peer = self.peers.get(addr)
+        if peer is None:
+            return
+        _, expected, bitmap = ACK_PACKET.unpack_from(payload)
+        if Distance(expected, peer.base) > len(peer.flight):
+            # Older than an acknowledgement already handled
+            return
+
+        now = time()
+        advanced = expected != peer.base
+        while peer.base != expected:
+            segment = peer.flight.pop(peer.base)
+            if not segment.sacked:
+                self.Measure(peer, segment, now)
+            peer.base = (peer.base + 1) & 0xFFFF
+
+        for offset in range(WINDOW):
+            if bitmap >> offset & 1:
+                segment = peer.flight.get((expected + offset + 1) & 0xFFFF)
+                if segment is not None and not segment.sacked:
+                    segment.sacked = True
+                    self.Measure(peer, segment, now)
+
+        if advanced:
+            peer.dupacks = 0
+        elif bitmap and peer.flight:
+            # Later segments arrived but not this one: it was probably
+            #  lost, so don't wait for its timer
+            peer.dupacks += 1
+            if peer.dupacks == 3:
+                self.Resend(addr, peer, peer.base, now)
+
+    def Measure(self, peer, segment, now):
+        """
+        Updates the retransmit timeout from a segment's round trip.  As in
+          Karn's algorithm, retransmitted segments are ignored since it's
+          unclear which copy was acknowledged.
+        """
+        if segment.retransmitted:
+            return
+        rtt = now - segment.sent
+        if peer.srtt is None:
+            peer.srtt = rtt
+            peer.rttvar = rtt / 2
+        else:
+            peer.rttvar = 0.75 * peer.rttvar + 0.25 * abs(peer.srtt - rtt)
+            peer.srtt = 0.875 * peer.srtt + 0.125 * rtt
+        peer.rto = min(self.maximum,
+                       max(self.minimum, peer.srtt + 4 * peer.rttvar))
+
+    def Transmit(self, addr, peer, now):
+        """
+        Sends queued segments while the window has room, in one write.
+        """
+        packets = []
+        while peer.queue and len(peer.flight) < self.window:
+            segment = Segment(peer.queue.popleft())
+            segment.sent = now
+            segment.deadline = now + peer.rto
+            peer.flight[peer.next] = segment
+            packets.append((addr, DATA_HEADER.pack(DATA, peer.next)
+                            + segment.data))
+            peer.next = (peer.next + 1) & 0xFFFF
+        if packets:
+            self.sent += len(packets)
+            self.driver.SendMany(packets, self.options)
+
+    def Retransmit(self, addr, peer, now):
+        """
+        Resends segments whose timer expired and that the receiver hasn't
+          selectively acknowledged.
+        """
+        expired = [seq for seq, segment in peer.flight.items()
+                   if not segment.sacked and segment.deadline <= now]
+        if not expired:
+            return
+        self.timeouts += 1
+        if expired[0] == next(iter(peer.flight)):
+            # Back off until a fresh round trip is measured.  Like TCP's
+            #  single timer, only the oldest segment's expiry counts, or
+            #  a burst of losses would back off once per segment.
+            peer.rto = min(self.maximum, peer.rto * 2)
+        for seq in expired:
+            self.Resend(addr, peer, seq, now)
+
+    def Resend(self, addr, peer, seq, now):
+        segment = peer.flight[seq]
+        segment.retransmitted = True
+        segment.deadline = now + peer.rto
+        self.retransmits += 1
+        self.driver.Send(DATA_HEADER.pack(DATA, seq) + segment.data, addr,
+                         self.options)
@@ -0,0 +1,134 @@
+import itertools
+import queue
+import threading
+from collections import OrderedDict
+from time import monotonic, perf_counter
+
+# What put() does when the queue is full
+BLOCK = 'block'                # Wait for the consumer to make room
+DROP_OLDEST = 'drop-oldest'    # Discard the oldest queued message
+DROP_NEWEST = 'drop-newest'    # Discard the message being added
+LATEST = 'latest'              # Keep only the newest message per source
+
+POLICIES = (BLOCK, DROP_OLDEST, DROP_NEWEST, LATEST)
+
+
+class RxQueue():
+    """
+    Receive queue with an optional capacity and a policy for what to do
+      when a stalled consumer lets it fill up.  get() behaves like
+      queue.Queue.get(), raising queue.Empty on timeout.
+
+    With the LATEST policy, a message replaces any message from the same
+      source address still waiting in the queue, whether or not the queue is
+      full; the queue then holds at most one message per source.  Messages
+      without a source address are queued as with DROP_OLDEST.
+    """
+
+    def __init__(self, maxsize=0, policy=BLOCK):
+        """
+        Inputs:
+          maxsize: Maximum number of queued messages, 0 for no limit
+          policy: One of BLOCK, DROP_OLDEST, DROP_NEWEST or LATEST
+        """
+        if policy not in POLICIES:
+            raise ValueError("Unknown receive queue policy: {}".format(policy))
+        self.maxsize = maxsize
+        self.policy = policy
+        self.items = OrderedDict()
+        self.keys = itertools.count()
+        self.dropped = 0
+        self.replaced = 0
+        self.high = 0
+        self.closed = False
+        self.cond = threading.Condition()
+        # Optional XBee_Metrics.Histogram of how long messages were queued
+        self.waits = None
+        self.stamps = {}
+
+    def qsize(self):
+        return len(self.items)
+
+    def empty(self):
+        return not self.items
+
+    def full(self):
+        return 0 < self.maxsize <= len(self.items)
+
+    def close(self):
+        """
+        Releases a put() blocked on a full queue; later puts are dropped.
+        """
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def put(self, item):
+        """
+        Queues a message, applying the policy if the queue is full.
+
+        Outputs:
+          True if the message was queued, False if it was dropped
+        """
+        with self.cond:
+            key = None
+            if self.policy == LATEST:
+                key = getattr(item, 'source', None)
+                if key is not None and key in self.items:
+                    self.items[key] = item
+                    self.replaced += 1
+                    if self.waits is not None:
+                        self.stamps[key] = perf_counter()
+                    return True
+
+            if self.full():
+                if self.policy == BLOCK:
+                    while self.full() and not self.closed:
+                        self.cond.wait()
+                if self.policy == DROP_NEWEST or self.closed:
+                    self.dropped += 1
+                    return False
+                if self.full():
+                    oldest = self.items.popitem(last=False)[0]
+                    self.stamps.pop(oldest, None)
+                    self.dropped += 1
+
+            if key is None:
+                key = next(self.keys)
+                # Keep generated keys apart from source addresses
+                key = (key,)
+            self.items[key] = item
+            if self.waits is not None:
+                self.stamps[key] = perf_counter()
+            if len(self.items) > self.high:
+                self.high = len(self.items)
+            self.cond.notify_all()
+            return True
+
+    def get(self, block=True, timeout=None):
+        """
+        Removes and returns the oldest message.  Raises queue.Empty if
+          none arrives within `timeout` seconds.
+        """
+        with self.cond:
+            if block:
+                # Monotonic, as queue.Queue is, so clock steps don't matter
+                deadline = None if timeout is None else monotonic() + timeout
+                while not self.items:
+                    remaining = (None if deadline is None
+                                 else deadline - monotonic())
+                    if remaining is not None and remaining <= 0:
+                        break
+                    self.cond.wait(remaining)
+            if not self.items:
+                raise queue.Empty
+
+            key, item = self.items.popitem(last=False)
+            stamp = self.stamps.pop(key, None)
+            if stamp is not None and self.waits is not None:
+                self.waits.Add(perf_counter() - stamp)
+            self.cond.notify_all()
+            return item
+
+    def get_nowait(self):
+        return self.get(block=False)
@@ -1,31 +1,74 @@
 import serial
 import threading
-try:
-    import Queue  # Python 2.7
-except:
-    import queue as Queue  # Python 3.3
+import queue
 from time import sleep
+import XBee_Core
+import XBee_RxQueue
 
 
-class XBee(threading.Thread):
-    rxbuff = bytearray()
-    RxQ = Queue.Queue()
-    stop = threading.Event()
-    rx = True
+class XBee(XBee_Core.Core, threading.Thread):
+    """
+    Threaded driver: a reader thread queues messages as they arrive.
+      Sends and frame handling are shared with the other drivers in
+      XBee_Core.
+    """
+    # Longest a blocking read waits before checking for shutdown
+    wait = 0.1
 
-    def __init__(self, serialport):
+    def __init__(self, serialport, poll=None, trace=None, maxsize=0,
+                 policy=XBee_RxQueue.BLOCK, family=None, metrics=None,
+                 baudrate=9600):
+        """
+        Inputs:
+            serialport: Name of the serial port the XBee is attached to
+            poll(optional): By default the reader thread blocks on the port
+              until bytes arrive.  Set to a number of seconds to instead
+              check the port at that interval, as older versions did.
+            trace(optional): XBee_Trace object that records every frame
+              sent and received (default: no tracing)
+            maxsize(optional): Most messages to hold in the receive queue
+              (default 0: no limit)
+            policy(optional): What to do when the receive queue is full;
+              one of the XBee_RxQueue policies (default: block the reader).
+              Dropped messages are counted in RxQ.dropped.
+            family(optional): XBee_Protocol family name
+              (default: XBee_Protocol.SERIES1)
+            metrics(optional): XBee_Metrics.Metrics object
+              (default: no metrics)
+            baudrate(optional): Serial baud rate (default 9600)
+        """
         threading.Thread.__init__(self)
-        self.serial = serial.Serial(port=serialport, baudrate=9600, timeout=0)
+        XBee_Core.Core.__init__(self, trace, family, metrics)
+        self.poll = poll
+        self.RxQ = XBee_RxQueue.RxQueue(maxsize, policy)
+        if metrics:
+            self.RxQ.waits = metrics.wait
+        self.stop = threading.Event()
+        # Set by Discard() for the reader thread, which answers on `discarded`
+        self.discard = threading.Event()
+        self.discarded = threading.Event()
+        self.discarding = threading.Lock()
+        self.rx = True
+        self.serial = serial.Serial(port=serialport, baudrate=baudrate,
+                                    timeout=0 if poll else self.wait)
         self.start()
 
     def shutdown(self):
+        if self.txq is not None:
+            self.txq.shutdown()
         self.stop.set()
+        # Release the reader thread if it's blocked on a full queue
+        self.RxQ.close()
+        if hasattr(self.serial, 'cancel_read'):
+            # Wake the reader thread if it's blocked on the port
+            self.serial.cancel_read()
         self.join()
 
     def run(self):
         while not self.stop.is_set():
             self.Rx()
-            sleep(0.01)
+            if self.poll:
+                sleep(self.poll)
 
     def Receive(self, wait=5):
         """
@@ -34,194 +77,50 @@ class XBee(threading.Thread):
         Inputs:
             wait(optional): Desired number of seconds to wait for a message
         Output:
-            Message, if received.  None if timed out.
+            Message, if received, as an XBee_Frames object for its
+            API type.  None if timed out.
         """
         try:
             return self.RxQ.get(timeout=wait)
-        except Queue.Empty:
+        except queue.Empty:
             return None
 
     def Rx(self):
         """
         Checks serial for an incoming message.  If a message
-         is received, calles Parse() to verify it is a properly
-         formatted XBee API message.
-        """
-        if self.serial.inWaiting():
+         is received, feeds it to the decoder, which queues every
+         properly formatted XBee API message.  Unless polling, waits
+         up to `wait` seconds for the first byte to arrive.
+        """
+        # With a read timeout, asking for one byte blocks until data
+        #  arrives; in polling mode it returns right away.
+        chunk = self.serial.read(self.serial.inWaiting() or 1)
+        while chunk and not self.discard.is_set():
+            self.Received(chunk)
             remaining = self.serial.inWaiting()
-            while remaining > 0:
-                chunk = self.serial.read(remaining)
-                remaining -= len(chunk)
-                self.rxbuff.extend(chunk)
-
-            msgs = self.rxbuff.split(bytes(b'\x7E'))
-            for msg in msgs[:-1]:
-                self.Validate(msg)
-
-            if self.Validate(msgs[-1]):
-                self.rxbuff = bytearray()
-            else:
-                self.rxbuff = msgs[-1]
-
-    def SendStr(self, msg, addr=0xFFFF, options=0x01, frameid=0x00):
-        """
-        Inputs:
-            msg: A message, in string format, to be sent to an XBee
-            addr: The 16 bit address of the destination XBee
-              (default: 0xFFFF broadcast)
-            options: Optional byte to specify transmission options
-              (default 0x01: disable acknowledge)
-            frameod: Optional frameid, only used if Tx status is desired
-        Returns:
-            Message sent to XBee; stripped of start delimeter,
-            MSB, LSB, and checksum; formatted into a readable string
-        """
-        return self.Send(msg.encode('utf-8'), addr, options, frameid)
-
-    def Send(self, msg, addr=0xFFFF, options=0x01, frameid=0x00):
-        """
-        Inputs:
-            msg: A message, in bytes or bytearray format, to be sent to an XBee
-            addr: The 16 bit address of the destination XBee
-              (default broadcast)
-            options: Optional byte to specify transmission options
-              (default 0x01: disable ACK)
-            frameod: Optional frameid, only used if transmit status is desired
-        Returns:
-            Number of bytes sent
-        """
-        if not msg:
-            return 0
-
-        hexs = '7E 00 {:02X} 01 {:02X} {:02X} {:02X} {:02X}'.format(
-            len(msg) + 5,           # LSB (length)
-            frameid,
-            (addr & 0xFF00) >> 8,   # Destination address high byte
-            addr & 0xFF,            # Destination address low byte
-            options
-        )
-
-        frame = bytearray.fromhex(hexs)
-        #  Append message content
-        for c in msg:
-            frame.append(c)
-
-        # Calculate checksum byte
-        frame.append(self.CheckSum(frame))
-
-        # Escape any bytes containing reserved characters
-        frame = self.Escape(frame)
-
-        print("Tx: " + self.format(frame))
-        return self.serial.write(frame)
-
-    def Validate(self, msg):
-        """
-        Parses a byte or bytearray object to verify the contents are a
-            properly formatted XBee message.  If validated, returns
-            received message
-        """
-        # 10 bytes is Minimum length to be Rx message
-        #  Src LSB, RSSI, Options, 1 byte data, checksum
-        if len(msg) < 9:
-            return False
-
-        # All bytes in message must be unescaped.
-        #  Only exception is the start delimiter at the beginning
-        frame = self.Unescape(msg)
-        if not frame:
-            return False
-
-        LSB = frame[1]
-        # Frame (minus checksum) must contain at least length of LSB
-        if LSB > (len(frame[2:]) - 1):
-            return False
-
-        # Validate checksum
-        if (sum(frame[2:3+LSB]) & 0xFF) != 0xFF:
-            return False
-
+            chunk = self.serial.read(remaining) if remaining else None
+        if self.discard.is_set():
+            XBee_Core.Core.Discard(self)
+            self.discard.clear()
+            self.discarded.set()
+        self.tracker.Expire()
+
+    def Discard(self):
+        """
+        Drops everything received but not yet decoded.  The reader thread
+          does it between reads, so it never resets the decoder mid-Feed();
+          this waits until it has.
+        """
+        if threading.current_thread() is self or not self.is_alive():
+            return XBee_Core.Core.Discard(self)
+        with self.discarding:
+            self.discarded.clear()
+            self.discard.set()
+            if hasattr(self.serial, 'cancel_read'):
+                self.serial.cancel_read()
+            while not self.discarded.wait(self.wait):
+                if not self.is_alive():
+                    return XBee_Core.Core.Discard(self)
+
+    def Deliver(self, frame):
         self.RxQ.put(frame)
-        print("Rx: " + self.format(msg))
-        return True
-
-    def Unescape(self, msg):
-        """
-        Helper function to unescaped an XBee API message.
-
-        Inputs:
-            msg: An byte or bytearray object containing a raw XBee message
-                    minus the start delimeter
-
-        Outputs:
-            XBee message with original characters.
-        """
-        if msg[-1] == 0x7D:
-            # Last byte indicates an escape, can't unescape that
-            return None
-
-        out = bytearray()
-        skip = False
-        for i in range(len(msg)):
-            if skip:
-                skip = False
-                continue
-
-            if msg[i] == 0x7D:
-                out.append(msg[i+1] ^ 0x20)
-                skip = True
-            else:
-                out.append(msg[i])
-
-        return out
-
-    def Escape(self, msg):
-        """
-        Escapes reserved characters before an XBee message is sent.
-
-        Inputs:
-            msg: A bytes or bytearray object containing an original message to
-                    be sent to an XBee
-
-        Outputs:
-            A bytearray object prepared to be sent to an XBee in API mode
-        """
-        escaped = bytearray()
-        reserved = bytearray("\x7E\x7D\x11\x13")
-
-        escaped.append(msg[0])
-        for m in msg[1:]:
-            if m in reserved:
-                escaped.append(0x7D)
-                escaped.append(m ^ 0x20)
-            else:
-                escaped.append(m)
-
-        return escaped
-
-    def CheckSum(self, msg):
-        """
-        Calculate the checksum byte for an XBee message.
-
-        Input:
-            msg: An unescaped byte or bytearray object containing a
-              full XBee message
-
-        Output:
-            A single byte containing the message checksum
-        """
-        return 0xFF - (sum(msg[3:]) & 0xFF)
-
-    def format(self, msg):
-        """
-        Formats a byte or bytearray object into a more human
-          readable string where each hexadecimal bytes are ascii
-          characters separated by spaces
-
-        Input:
-            msg: A bytes or bytearray object
-
-        Output:
-            A string representation
-        """
-        return " ".join("{:02x}".format(b) for b in msg)
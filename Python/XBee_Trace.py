@@ -0,0 +1,110 @@
+"""
+Optional tracing of the frames a driver sends and receives.
+
+Drivers take a `trace` object with Rx(frame) and Tx(frame) methods and
+  skip tracing entirely when it is None, which is the default.  Received
+  frames are traced unescaped and minus the start delimiter, as the decoder
+  produces them; transmitted frames exactly as written to serial.
+
+Nothing here formats hex until someone actually reads the trace.
+"""
+import logging
+import struct
+from collections import deque
+from time import time
+
+RX = 0
+TX = 1
+DIRECTIONS = ("Rx", "Tx")
+
+# Timestamp, direction, frame length
+RECORD = struct.Struct('>dBH')
+
+
+class Hex():
+    """
+    Formats a frame as hex when converted to a string, and not before.
+    """
+    __slots__ = ('msg',)
+
+    def __init__(self, msg):
+        self.msg = msg
+
+    def __str__(self):
+        return " ".join("{:02x}".format(b) for b in self.msg)
+
+
+class RingTrace():
+    """
+    Keeps the most recent frames and the time they were traced in memory.
+    """
+
+    def __init__(self, size=1024):
+        """
+        Inputs:
+          size: Number of frames to keep
+        """
+        self.records = deque(maxlen=size)
+
+    def Rx(self, frame):
+        self.records.append((time(), RX, bytes(frame)))
+
+    def Tx(self, frame):
+        self.records.append((time(), TX, bytes(frame)))
+
+    def Lines(self):
+        """
+        Outputs:
+          A list of human readable strings, oldest frame first
+        """
+        return ["{:.6f} {}: {}".format(stamp, DIRECTIONS[direction], Hex(data))
+                for stamp, direction, data in self.records]
+
+    def Dump(self, f):
+        """
+        Writes the trace to a binary file object; each record is a
+          timestamp (double), direction (0 Rx, 1 Tx), length and the frame.
+        """
+        for stamp, direction, data in self.records:
+            f.write(RECORD.pack(stamp, direction, len(data)))
+            f.write(data)
+
+    @staticmethod
+    def Load(f):
+        """
+        Reads records written by Dump() back from a binary file object.
+
+        Outputs:
+          A list of (timestamp, direction, frame) tuples
+        """
+        records = []
+        header = f.read(RECORD.size)
+        while len(header) == RECORD.size:
+            stamp, direction, length = RECORD.unpack(header)
+            records.append((stamp, direction, f.read(length)))
+            header = f.read(RECORD.size)
+        return records
+
+
+class LogTrace():
+    """
+    Sends frames to a logging logger at DEBUG level.  The hex string is
+      only built if a handler actually emits the record.
+    """
+
+    def __init__(self, logger="XBee"):
+        """
+        Inputs:
+          logger: A logging.Logger or the name of one
+        """
+        if not isinstance(logger, logging.Logger):
+            logger = logging.getLogger(logger)
+        self.logger = logger
+
+    def Rx(self, frame):
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Rx: %s", Hex(frame))
+
+    def Tx(self, frame):
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Tx: %s", Hex(frame))
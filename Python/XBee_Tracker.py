@@ -0,0 +1,107 @@
+import threading
+from time import monotonic
+from concurrent.futures import Future, TimeoutError
+
+
+class Tracker():
+    """
+    Hands out frame IDs and matches incoming status frames
+      (TX status, AT response) to the request that used the same ID.
+
+    IDs 1-255 are handed out round-robin, skipping any still waiting
+      on a status.  Frame ID 0 is never used, since it tells the XBee
+      not to send a status frame at all.
+    """
+
+    def __init__(self, timeout=5.0):
+        """
+        Inputs:
+          timeout: Default number of seconds to wait for a status frame
+            before the request fails with a TimeoutError
+        """
+        self.timeout = timeout
+        self.pending = {}
+        self.last = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.pending)
+
+    def Allocate(self, timeout=None):
+        """
+        Reserves the next free frame ID.
+
+        Inputs:
+          timeout: Optional number of seconds to wait for the status frame
+            (default: the tracker's timeout)
+
+        Outputs:
+          A tuple of the frame ID and a concurrent.futures.Future that
+            resolves to the status frame with that ID
+        """
+        # Monotonic, so a wall clock step can't expire or strand requests
+        deadline = monotonic() + (self.timeout if timeout is None
+                                  else timeout)
+        future = Future()
+        with self.lock:
+            for _ in range(255):
+                self.last = self.last % 255 + 1
+                if self.last not in self.pending:
+                    self.pending[self.last] = (future, deadline)
+                    return self.last, future
+
+        raise RuntimeError("All 255 frame IDs are waiting on a status frame")
+
+    def Release(self, frameid):
+        """
+        Gives up on a frame ID, e.g. when the frame could not be written.
+        """
+        with self.lock:
+            entry = self.pending.pop(frameid, None)
+        if entry:
+            entry[0].cancel()
+
+    def Resolve(self, frame):
+        """
+        Completes the request waiting on a received status frame.
+
+        Inputs:
+          frame: An XBee_Frames object
+
+        Outputs:
+          True if the frame was consumed by a pending request, otherwise False
+        """
+        frameid = getattr(frame, 'frameid', None)
+        if not frameid:
+            return False
+
+        with self.lock:
+            entry = self.pending.pop(frameid, None)
+        if not entry:
+            return False
+
+        # The caller may have cancelled it, but the status is still consumed
+        if entry[0].set_running_or_notify_cancel():
+            entry[0].set_result(frame)
+        return True
+
+    def Expire(self, now=None):
+        """
+        Fails every request whose status frame hasn't arrived in time.
+
+        Outputs:
+          Number of requests that timed out
+        """
+        now = monotonic() if now is None else now
+        with self.lock:
+            if not self.pending:
+                return 0
+            expired = [frameid for frameid, (_, deadline)
+                       in self.pending.items() if deadline <= now]
+            futures = [self.pending.pop(frameid)[0] for frameid in expired]
+
+        for future in futures:
+            if future.set_running_or_notify_cancel():
+                future.set_exception(TimeoutError(
+                    "No status frame received in time"))
+        return len(futures)
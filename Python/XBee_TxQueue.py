@@ -0,0 +1,136 @@
+import threading
+from time import time
+
+
+class TxQueue(threading.Thread):
+    """
+    Collects outgoing frames and writes them to serial in batches.
+
+    The writer thread waits for more frames while they keep arriving within
+      `window` seconds of each other, then writes everything queued as one
+      contiguous buffer.  A batch is written early once it reaches `budget`
+      bytes, and no frame waits longer than `latency` seconds.
+
+    Frames are written in the order they were queued, so frames for any
+      one destination are never reordered.
+
+    Counters:
+      written: Bytes written
+      failed: Bytes lost because their write raised an exception, which
+        is kept in `error` until flush() reports it
+    """
+
+    def __init__(self, write, window=0.002, budget=256, latency=0.01):
+        """
+        Inputs:
+          write: Function that writes a bytes object, e.g. serial.write
+          window: Seconds to wait for another frame before writing
+          budget: Number of queued bytes that triggers an immediate write
+          latency: Longest time in seconds a queued frame may wait
+        """
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.write = write
+        self.window = window
+        self.budget = budget
+        self.latency = latency
+        self.pending = bytearray()
+        self.first = 0
+        self.last = 0
+        self.queued = 0
+        self.written = 0
+        self.failed = 0
+        self.writes = 0
+        self.frames = 0
+        self.flushing = 0
+        self.stopped = False
+        self.error = None
+        self.cond = threading.Condition()
+        self.start()
+
+    def Put(self, frame):
+        """
+        Queues an escaped frame, ready to be written.
+
+        Outputs:
+          Number of bytes queued
+        """
+        with self.cond:
+            if self.stopped:
+                raise ValueError("Transmit queue is shut down")
+            self.last = time()
+            if not self.pending:
+                self.first = self.last
+                self.cond.notify_all()
+            self.pending.extend(frame)
+            self.queued += len(frame)
+            self.frames += 1
+            if len(self.pending) >= self.budget:
+                self.cond.notify_all()
+        return len(frame)
+
+    def flush(self, timeout=None):
+        """
+        Writes anything still queued and waits until it has been written.
+
+        Outputs:
+          True if everything queued before the call was written without
+            error, False if a write failed since the last flush() or the
+            timeout expired
+        """
+        with self.cond:
+            target = self.queued
+            self.flushing += 1
+            self.cond.notify_all()
+            try:
+                done = self.cond.wait_for(
+                    lambda: self.written + self.failed >= target, timeout)
+            finally:
+                self.flushing -= 1
+            error, self.error = self.error, None
+            return done and error is None
+
+    def shutdown(self):
+        """
+        Writes anything still queued and stops the writer thread.
+        """
+        with self.cond:
+            self.stopped = True
+            self.cond.notify_all()
+        self.join()
+
+    def run(self):
+        while True:
+            with self.cond:
+                while not self.pending and not self.stopped:
+                    self.cond.wait()
+                if not self.pending:
+                    return
+
+                while not (self.stopped or self.flushing or
+                           len(self.pending) >= self.budget):
+                    deadline = min(self.last + self.window,
+                                   self.first + self.latency)
+                    remaining = deadline - time()
+                    if remaining <= 0:
+                        break
+                    self.cond.wait(remaining)
+
+                batch = bytes(self.pending)
+                del self.pending[:]
+
+            try:
+                self.write(batch)
+                error = None
+            except Exception as exc:
+                # Not much the writer thread can do; flush() reports it
+                error = exc
+
+            with self.cond:
+                if error is None:
+                    self.written += len(batch)
+                else:
+                    self.failed += len(batch)
+                    self.error = error
+                self.writes += 1
+                self.cond.notify_all()
@@ -0,0 +1,60 @@
+import sys
+from time import perf_counter
+import XBee_Baud
+import XBee_Emulator
+import XBee_Threaded
+
+# Rx16 frame bytes around the payload: delimiter, length, API, address,
+#  RSSI, options, checksum
+FRAMING = 9
+SIZE = 100
+# Seconds each rate is measured for
+DURATION = 2.0
+
+
+def Run(rate, size=SIZE, duration=DURATION):
+    """
+    Switches a virtual radio with a 9600 baud UART and the threaded driver
+      to `rate`, then streams RX frames faster than the UART carries them.
+
+    Outputs:
+      Frames per second received, the most the UART allows, and seconds
+        spent negotiating
+    """
+    radio = XBee_Emulator.VirtualRadio(baudrate=9600, seed=1)
+    xbee = XBee_Threaded.XBee(radio.port)
+    try:
+        start = perf_counter()
+        if XBee_Baud.Negotiate(xbee, rate) != rate:
+            raise RuntimeError("Couldn't switch to {} baud".format(rate))
+        negotiated = perf_counter() - start
+
+        ceiling = rate / float(XBee_Emulator.BITS) / (size + FRAMING)
+        count = max(10, int(ceiling * duration))
+        radio.Stream(ceiling * 2, size, count)
+
+        received = 0
+        start = last = perf_counter()
+        while received < count:
+            msg = xbee.Receive(wait=1)
+            if msg is None:
+                break
+            received += 1
+            last = perf_counter()
+        return received / (last - start), ceiling, negotiated
+    finally:
+        xbee.shutdown()
+        radio.shutdown()
+
+
+if __name__ == "__main__":
+    rates = [int(r) for r in sys.argv[1:]] or [r for r in XBee_Baud.RATES
+                                                if r >= 9600]
+    print("{:>7} {:>10} {:>10} {:>7} {:>9} {:>12}".format(
+        "baud", "frames/s", "ceiling", "used", "speedup", "negotiate ms"))
+    base = None
+    for rate in rates:
+        fps, ceiling, negotiated = Run(rate)
+        base = base or fps
+        print("{:>7} {:>10.1f} {:>10.1f} {:>6.0%} {:>8.1f}x {:>12.1f}".format(
+            rate, fps, ceiling, fps / ceiling, fps / base, negotiated * 1e3))
@@ -0,0 +1,72 @@
+import random
+import timeit
+import XBee_Codec
+
+
+def Escape(msg):
+    """ The original per-byte escape loop, kept for comparison """
+    escaped = bytearray()
+    reserved = bytearray(b"\x7E\x7D\x11\x13")
+
+    for m in msg:
+        if m in reserved:
+            escaped.append(0x7D)
+            escaped.append(m ^ 0x20)
+        else:
+            escaped.append(m)
+
+    return escaped
+
+
+def Unescape(msg):
+    """ The original per-byte unescape loop, kept for comparison """
+    if msg[-1] == 0x7D:
+        return None
+
+    out = bytearray()
+    skip = False
+    for i in range(len(msg)):
+        if skip:
+            skip = False
+            continue
+
+        if msg[i] == 0x7D:
+            out.append(msg[i+1] ^ 0x20)
+            skip = True
+        else:
+            out.append(msg[i])
+
+    return out
+
+
+def Payload(size, density):
+    """
+    Builds a random payload where roughly `density` of the bytes
+      are reserved characters that need escaping.
+    """
+    rand = random.Random(size)
+    reserved = bytearray(b"\x7E\x7D\x11\x13")
+    plain = [b for b in range(256) if b not in reserved]
+    return bytearray(rand.choice(reserved) if rand.random() < density
+                     else rand.choice(plain) for _ in range(size))
+
+
+if __name__ == "__main__":
+    number = 20000
+    print("{:>5} {:>8} {:>12} {:>12} {:>12} {:>12}".format(
+        "size", "reserved", "escape", "codec", "unescape", "codec"))
+
+    for size in (1, 5, 10, 25, 50, 75, 100):
+        for density in (0.0, 0.05, 0.5):
+            msg = Payload(size, density)
+            raw = bytes(XBee_Codec.Escape(msg))
+            assert Escape(msg) == XBee_Codec.Escape(msg)
+            assert Unescape(raw) == XBee_Codec.Unescape(raw)
+
+            # Microseconds per call
+            calls = ((Escape, msg), (XBee_Codec.Escape, msg),
+                     (Unescape, raw), (XBee_Codec.Unescape, raw))
+            times = [timeit.timeit(lambda: f(arg), number=number) / number
+                     * 1e6 for f, arg in calls]
+            print("{:>5} {:>8.0%}".format(size, density) +
+                  "".join(" {:>10.2f}us".format(t) for t in times))
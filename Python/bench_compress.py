@@ -0,0 +1,90 @@
+import os
+import random
+import timeit
+import XBee_Compress
+
+# Serial bits per byte at 8N1
+BITS = 10
+BAUD = 9600
+# Tx16 frame bytes around the payload: delimiter, length, API, frame ID,
+#  address, options, checksum
+FRAMING = 9
+
+
+def Messages(kind, count, seed):
+    """
+    Synthetic messages of one class, as small nodes typically send them.
+    """
+    rand = random.Random(seed)
+    messages = []
+    for seq in range(count):
+        node = rand.randint(1, 40)
+        temp = rand.uniform(-10, 40)
+        hum = rand.uniform(10, 90)
+        batt = rand.uniform(3.2, 4.2)
+        if kind == 'json':
+            msg = ('{{"id":"node-{:02d}","t":{:.2f},"h":{:.1f},"batt":{:.2f},'
+                   '"seq":{}}}').format(node, temp, hum, batt, seq)
+        elif kind == 'csv':
+            msg = "node{:02d},{},{:.2f},{:.1f},{:.2f},{}".format(
+                node, 1700000000 + seq * 30, temp, hum, batt,
+                rand.choice(("OK", "OK", "OK", "LOW")))
+        elif kind == 'status':
+            msg = ("STATUS node-{:02d} uptime={}s rssi=-{}dBm queue={} "
+                   "errors={}").format(node, seq * 30, rand.randint(40, 90),
+                                       rand.randint(0, 3), rand.randint(0, 2))
+        elif kind == 'log':
+            msg = ("{} 2024-05-01T12:{:02d}:{:02d}Z pump controller: pressure "
+                   "{:.2f} bar {} threshold").format(
+                       rand.choice(("INFO", "WARN")), seq // 60 % 60, seq % 60,
+                       rand.uniform(1, 3), rand.choice(("above", "below")))
+        else:
+            msg = None
+        messages.append(msg.encode('utf-8') if msg else os.urandom(32))
+    return messages
+
+
+def Sizes(codec, messages):
+    """
+    Outputs:
+      Mean payload bytes sent, fraction sent raw, and microseconds to
+        encode and decode each message
+    """
+    encoded = [codec.Encode(m) for m in messages]
+    assert [codec.Decode(e) for e in encoded] == messages
+    raw = sum(1 for e in encoded if e[0] == XBee_Compress.RAW)
+    number = 5
+    encode = timeit.timeit(lambda: [codec.Encode(m) for m in messages],
+                           number=number)
+    decode = timeit.timeit(lambda: [codec.Decode(e) for e in encoded],
+                           number=number)
+    per = 1e6 / number / len(messages)
+    return (sum(map(len, encoded)) / float(len(messages)),
+            raw / float(len(messages)), encode * per, decode * per)
+
+
+if __name__ == "__main__":
+    kinds = ('json', 'csv', 'status', 'log', 'random')
+    training = dict((k, Messages(k, 200, 1)) for k in kinds)
+    shared = XBee_Compress.Train(
+        [m for k in kinds for m in training[k]], size=2048)
+
+    print("{:>7} {:>6} {:>8} {:>8} {:>8} {:>7} {:>6} {:>8} {:>8} {:>9}".format(
+        "class", "raw B", "deflate", "dict", "shared", "saved", "raw %",
+        "enc us", "dec us", "ms/msg"))
+    for kind in kinds:
+        messages = Messages(kind, 500, 2)
+        size = sum(map(len, messages)) / float(len(messages))
+
+        plain = Sizes(XBee_Compress.Codec(), messages)
+        own = Sizes(XBee_Compress.Codec(
+            {0x10: XBee_Compress.Train(training[kind])}), messages)
+        common = Sizes(XBee_Compress.Codec({0x11: shared}), messages)
+
+        # Serial time saved per message with the class's own dictionary
+        saved = (size - own[0]) * BITS / BAUD * 1e3
+        print("{:>7} {:>6.1f} {:>8.1f} {:>8.1f} {:>8.1f} {:>6.0%} {:>6.0%} "
+              "{:>8.1f} {:>8.1f} {:>9.2f}".format(
+                  kind, size, plain[0], own[0], common[0],
+                  (size - own[0]) / (size + FRAMING), own[1], own[2], own[3],
+                  saved))
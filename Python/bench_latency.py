@@ -0,0 +1,68 @@
+import os
+import pty
+import struct
+import threading
+from time import perf_counter, process_time, sleep
+import XBee_Codec
+import XBee_Threaded
+
+
+def Frame(stamp):
+    """
+    An RX16 frame carrying the time it was written as its payload.
+    """
+    payload = struct.pack('>d', stamp)
+    frame = bytearray(b'\x00\x00\x81\x00\x01\x28\x00')
+    frame[1] = len(payload) + 5
+    frame.extend(payload)
+    frame.append(0xFF - (sum(frame[2:]) & 0xFF))
+    return b'\x7E' + bytes(XBee_Codec.Escape(frame))
+
+
+def Measure(poll, frames=200, gap=0.005, idle=1.0):
+    """
+    Writes frames into a pty at `gap` second intervals and measures how
+      long each one takes to come out of Receive().
+
+    Outputs:
+      A sorted list of per-frame delays in seconds, and the CPU seconds
+        the process used while the radio was idle for `idle` seconds
+    """
+    master, slave = pty.openpty()
+    xbee = XBee_Threaded.XBee(os.ttyname(slave), poll=poll)
+
+    def radio():
+        for _ in range(frames):
+            os.write(master, Frame(perf_counter()))
+            sleep(gap)
+
+    delays = []
+    writer = threading.Thread(target=radio)
+    writer.start()
+    for _ in range(frames):
+        msg = xbee.Receive(wait=1)
+        if msg is None:
+            break
+        delays.append(perf_counter() - struct.unpack('>d', msg.payload)[0])
+    writer.join()
+
+    start = process_time()
+    sleep(idle)
+    cpu = process_time() - start
+
+    xbee.shutdown()
+    os.close(master)
+    return sorted(delays), cpu
+
+
+if __name__ == "__main__":
+    results = [(name, Measure(poll))
+               for name, poll in (("poll 10ms", 0.01), ("blocking", None))]
+
+    print("{:>10} {:>10} {:>10} {:>10} {:>12}".format(
+        "mode", "p50", "p90", "p99", "idle cpu"))
+    for name, (delays, cpu) in results:
+        percentiles = [delays[int(len(delays) * p)] * 1e3
+                       for p in (0.5, 0.9, 0.99)]
+        print("{:>10} {:>8.2f}ms {:>8.2f}ms {:>8.2f}ms {:>10.1f}ms".format(
+            name, *(percentiles + [cpu * 1e3])))
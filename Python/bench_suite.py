@@ -0,0 +1,389 @@
+"""
+Benchmarks for the receive, validate, escape and send hot paths.
+
+Each driver class (polling, threaded, asyncio) is fed synthetic byte
+  streams through a pty, covering payload sizes, escape density,
+  fragmentation and corruption.  The per-call paths (Unescape, Escape,
+  Validate, decoding and Send) are timed in process.  Every case reports
+  frames and bytes per second, per-frame latency percentiles and peak
+  memory.
+
+Usage:
+  python bench_suite.py [--save] [--quick] [filter]
+
+Results are compared to bench_baseline.json, next to this script.  --save
+  rewrites it, one metric per line, so a regression shows up as a diff.
+  `filter` runs only the cases whose name contains it.
+"""
+import asyncio
+import json
+import os
+import pty
+import random
+import sys
+import threading
+import tracemalloc
+import tty
+from bisect import bisect_left
+from time import perf_counter, sleep
+import XBee
+import XBee_Async
+import XBee_Codec
+import XBee_Protocol
+import XBee_Threaded
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'bench_baseline.json')
+RESERVED = bytearray(b'\x7E\x7D\x11\x13')
+PLAIN = [b for b in range(256) if b not in RESERVED]
+
+# Seconds without a frame before a receive case gives up on the rest
+IDLE = 0.5
+
+
+def Payload(size, density, rand):
+    """
+    Builds a random payload where roughly `density` of the bytes
+      are reserved characters that need escaping.
+    """
+    return bytearray(rand.choice(RESERVED) if rand.random() < density
+                     else rand.choice(PLAIN) for _ in range(size))
+
+
+class Stream():
+    """
+    A synthetic stream of escaped RX16 frames, split into the chunks a
+      radio would write.  Each frame's source address is its index, so the
+      receiver can tell which frame it got.
+    """
+
+    def __init__(self, frames, size, density, fragment=0, corrupt=0.0):
+        """
+        Inputs:
+          frames: Number of frames, at most 65536
+          size: Payload bytes per frame
+          density: Fraction of payload bytes that are reserved characters
+          fragment: Most bytes per chunk (default 0: one frame per chunk)
+          corrupt: Fraction of frames with one damaged byte
+        """
+        rand = random.Random(size)
+        rx16 = XBee_Protocol.BY_NAME['Rx16']
+        self.data = bytearray()
+        self.ends = []
+        self.good = 0
+        for index in range(frames):
+            frame = rx16.Encode(Payload(size, density, rand), index, 0x28, 0)
+            if corrupt and rand.random() < corrupt:
+                frame = bytearray(frame)
+                frame[rand.randrange(1, len(frame))] ^= 1 << rand.randrange(8)
+            else:
+                self.good += 1
+            self.data += frame
+            self.ends.append(len(self.data))
+
+        if fragment:
+            self.bounds, end = [], 0
+            while end < len(self.data):
+                end = min(end + rand.randint(1, fragment), len(self.data))
+                self.bounds.append(end)
+        else:
+            self.bounds = list(self.ends)
+
+    def Writer(self, fd):
+        """
+        Starts a thread writing the chunks to `fd`.
+
+        Outputs:
+          The thread, and a list that will hold the time each chunk was
+            written
+        """
+        stamps = [None] * len(self.bounds)
+
+        def write():
+            data = memoryview(self.data)
+            start = 0
+            for i, end in enumerate(self.bounds):
+                stamps[i] = perf_counter()
+                while start < end:
+                    start += os.write(fd, data[start:end])
+
+        writer = threading.Thread(target=write)
+        writer.daemon = True
+        writer.start()
+        return writer, stamps
+
+    def Sent(self, stamps, index):
+        """
+        Outputs:
+          When the chunk holding the last byte of frame `index` was written
+        """
+        return stamps[bisect_left(self.bounds, self.ends[index])]
+
+
+def Percentile(values, p):
+    return values[min(int(len(values) * p), len(values) - 1)] if values else 0
+
+
+def Result(frames, nbytes, elapsed, latencies, peak=0, lost=0):
+    latencies.sort()
+    elapsed = max(elapsed, 1e-9)
+    return {
+        'frames/s': frames / elapsed,
+        'MB/s': nbytes / elapsed / 1e6,
+        'p50 us': Percentile(latencies, 0.5) * 1e6,
+        'p90 us': Percentile(latencies, 0.9) * 1e6,
+        'p99 us': Percentile(latencies, 0.99) * 1e6,
+        'peak KiB': peak / 1024.0,
+        'lost': lost,
+    }
+
+
+def Pty():
+    master, slave = pty.openpty()
+    tty.setraw(master)
+    tty.setraw(slave)
+    return master, slave
+
+
+def Polling(stream, port, master):
+    xbee = XBee.XBee(port)
+    writer, stamps = stream.Writer(master)
+    received = []
+    last = perf_counter()
+    while len(received) < stream.good:
+        msg = xbee.Receive()
+        now = perf_counter()
+        if msg is not None:
+            received.append((msg, now))
+            last = now
+        elif now - last > IDLE:
+            break
+    writer.join()
+    xbee.serial.close()
+    return received, stamps
+
+
+def Threaded(stream, port, master):
+    xbee = XBee_Threaded.XBee(port)
+    writer, stamps = stream.Writer(master)
+    received = []
+    while len(received) < stream.good:
+        msg = xbee.Receive(wait=IDLE)
+        if msg is None:
+            break
+        received.append((msg, perf_counter()))
+    writer.join()
+    xbee.shutdown()
+    return received, stamps
+
+
+def Async(stream, port, master):
+    async def run():
+        async with XBee_Async.XBee(port) as xbee:
+            writer, stamps = stream.Writer(master)
+            received = []
+            while len(received) < stream.good:
+                msg = await xbee.Receive(wait=IDLE)
+                if msg is None:
+                    break
+                received.append((msg, perf_counter()))
+            # Keep the loop running so the writer can finish
+            while writer.is_alive():
+                await asyncio.sleep(0.01)
+            return received, stamps
+    return asyncio.run(run())
+
+
+DRIVERS = (('polling', Polling), ('threaded', Threaded), ('asyncio', Async))
+
+
+def Receive(driver, stream):
+    """
+    Streams frames through a pty into a driver.
+
+    Outputs:
+      The metrics, timed from the first write to the last frame received
+    """
+    master, slave = Pty()
+    try:
+        received, stamps = driver(stream, os.ttyname(slave), master)
+    finally:
+        os.close(master)
+        os.close(slave)
+
+    latencies = []
+    for msg, when in received:
+        if getattr(msg, 'api_id', None) == 0x81:
+            latencies.append(when - stream.Sent(stamps, msg.source))
+    elapsed = received[-1][1] - stamps[0] if received else 0
+    return Result(len(received), len(stream.data), elapsed, latencies,
+                  lost=stream.good - len(received))
+
+
+def Calls(call, args, nbytes):
+    """
+    Times one call per argument.
+
+    Outputs:
+      The metrics, with each call's duration as its latency
+    """
+    latencies = []
+    for arg in args:
+        start = perf_counter()
+        call(arg)
+        latencies.append(perf_counter() - start)
+    return Result(len(args), nbytes, sum(latencies), latencies)
+
+
+def Drain(fd, stop):
+    """ Reads and discards everything written to the other end of a pty """
+    while not stop.is_set():
+        try:
+            os.read(fd, 65536)
+        except OSError:
+            return
+
+
+def PerCall(op, size, density, calls):
+    """
+    Times one of the per-call hot paths on frames of the given shape.
+    """
+    rand = random.Random(size)
+    payloads = [Payload(size, density, rand) for _ in range(calls)]
+    rx16 = XBee_Protocol.BY_NAME['Rx16']
+    frames = [rx16.Encode(p, 0x0002, 0x28, 0) for p in payloads]
+
+    master, slave = Pty()
+    stop = threading.Event()
+    drain = threading.Thread(target=Drain, args=(master, stop))
+    drain.daemon = True
+    drain.start()
+    xbee = XBee.XBee(os.ttyname(slave))
+    try:
+        if op == 'unescape':
+            raw = [bytes(f[1:]) for f in frames]
+            return Calls(XBee_Codec.Unescape, raw, sum(map(len, raw)))
+        if op == 'escape':
+            plain = [XBee_Codec.Unescape(f[1:]) for f in frames]
+            plain = [bytearray(b'\x7E') + p for p in plain]
+            return Calls(xbee.Escape, plain, sum(map(len, plain)))
+        if op == 'validate':
+            raw = [bytearray(f[1:]) for f in frames]
+
+            def validate(msg):
+                xbee.Validate(msg)
+                xbee.RxMessages.clear()
+            return Calls(validate, raw, sum(map(len, raw)))
+        if op == 'decode':
+            def decode(frame):
+                xbee.Received(frame)
+                xbee.RxMessages.clear()
+            return Calls(decode, frames, sum(map(len, frames)))
+        if op == 'send':
+            return Calls(lambda p: xbee.Send(p, 0x0002), payloads,
+                         sum(map(len, frames)))
+        raise ValueError("Unknown operation: {}".format(op))
+    finally:
+        xbee.serial.close()
+        stop.set()
+        os.close(slave)
+        os.close(master)
+        drain.join()
+
+
+def Cases(quick=False):
+    """
+    Yields (name, function) for every benchmark case.
+    """
+    frames = 500 if quick else 2000
+    shapes = (
+        (8, 0.0, 0, 0.0),
+        (64, 0.0, 0, 0.0),
+        (100, 0.0, 0, 0.0),
+        (64, 0.5, 0, 0.0),
+        (64, 1.0, 0, 0.0),
+        (64, 0.0, 4, 0.0),
+        (64, 0.0, 0, 0.01),
+    )
+    for driver, run in DRIVERS:
+        for size, density, fragment, corrupt in shapes:
+            name = "rx {} size={} reserved={:.0%} fragment={} corrupt={:.0%}"
+            stream = Stream(frames, size, density, fragment, corrupt)
+            yield (name.format(driver, size, density, fragment, corrupt),
+                   lambda run=run, stream=stream: Receive(run, stream))
+
+    calls = 1000 if quick else 5000
+    for op in ('unescape', 'escape', 'validate', 'decode', 'send'):
+        for size in (8, 100):
+            for density in (0.0, 0.5):
+                name = "{} size={} reserved={:.0%}".format(op, size, density)
+                yield (name, lambda op=op, size=size, density=density:
+                       PerCall(op, size, density, calls))
+
+
+def Measure(bench):
+    """
+    Runs a case twice: once timed, once under tracemalloc for its peak
+      memory.
+    """
+    result = bench()
+    tracemalloc.start()
+    try:
+        bench()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    result['peak KiB'] = peak / 1024.0
+    return result
+
+
+def Load(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return {}
+
+
+def Save(path, results):
+    rounded = dict((name, dict((k, round(v, 1)) for k, v in r.items()))
+                   for name, r in results.items())
+    with open(path, 'w') as f:
+        json.dump(rounded, f, indent=1, sort_keys=True)
+        f.write('\n')
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    save = '--save' in args
+    quick = '--quick' in args
+    filters = [a for a in args if not a.startswith('--')]
+
+    baseline = Load(BASELINE)
+    results = {}
+    print("{:<52} {:>10} {:>7} {:>9} {:>9} {:>9} {:>9} {:>5} {:>8}".format(
+        "case", "frames/s", "MB/s", "p50 us", "p90 us", "p99 us",
+        "peak KiB", "lost", "vs base"))
+    for name, bench in Cases(quick):
+        if filters and not any(f in name for f in filters):
+            continue
+        result = results[name] = Measure(bench)
+
+        change = ""
+        if name in baseline and baseline[name]['frames/s']:
+            change = "{:+.0%}".format(
+                result['frames/s'] / baseline[name]['frames/s'] - 1)
+        print("{:<52} {:>10.0f} {:>7.2f} {:>9.1f} {:>9.1f} {:>9.1f} "
+              "{:>9.1f} {:>5} {:>8}".format(
+                  name, result['frames/s'], result['MB/s'], result['p50 us'],
+                  result['p90 us'], result['p99 us'], result['peak KiB'],
+                  result['lost'], change))
+        sleep(0.05)
+
+    if save:
+        if filters:
+            # Only replace the cases that were run
+            baseline.update(results)
+            results = baseline
+        Save(BASELINE, results)
+        print("Saved {}".format(BASELINE))
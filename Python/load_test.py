@@ -0,0 +1,54 @@
+import struct
+import sys
+from time import perf_counter
+import XBee_Emulator
+import XBee_Threaded
+
+
+def Run(rate, size, frames, fragment=0, corrupt=0.0):
+    """
+    Streams RX frames from a virtual radio into the threaded driver and
+      counts what comes out of Receive().
+
+    Outputs:
+      Frames per second received, frames lost, and the decoder's resyncs
+    """
+    radio = XBee_Emulator.VirtualRadio(fragment=fragment, corrupt=corrupt,
+                                       seed=1)
+    xbee = XBee_Threaded.XBee(radio.port)
+    radio.Stream(rate, size, frames)
+
+    seen = set()
+    start = last = perf_counter()
+    while len(seen) < frames:
+        msg = xbee.Receive(wait=1)
+        if msg is None:
+            break
+        if not hasattr(msg, 'payload') or len(msg.payload) < 4:
+            # A corrupted frame that still passed the checksum
+            continue
+        seen.add(struct.unpack_from('>I', msg.payload)[0])
+        last = perf_counter()
+    # Frames lost at the end would otherwise add Receive()'s timeout
+    elapsed = last - start
+
+    xbee.shutdown()
+    radio.shutdown()
+    return len(seen) / elapsed, frames - len(seen), xbee.decoder.resyncs
+
+
+if __name__ == "__main__":
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    cases = (
+        ("clean", dict()),
+        ("fragmented", dict(fragment=3)),
+        ("1% corrupt", dict(corrupt=0.01)),
+    )
+
+    print("{:>12} {:>6} {:>12} {:>8} {:>8}".format(
+        "case", "size", "frames/s", "lost", "resyncs"))
+    for size in (8, 64):
+        for name, options in cases:
+            rate, lost, resyncs = Run(20000, size, frames, **options)
+            print("{:>12} {:>6} {:>12.0f} {:>8} {:>8}".format(
+                name, size, rate, lost, resyncs))
@@ -1,15 +1,20 @@
+import logging
 import XBee
+import XBee_Trace
 from time import sleep
 
 if __name__ == "__main__":
-    xbee = XBee.XBee("COM3")  # Your serial port name here
+    # Print every frame sent and received
+    logging.basicConfig(level=logging.DEBUG, format="%(message)s")
+    xbee = XBee.XBee("COM3",  # Your serial port name here
+                     trace=XBee_Trace.LogTrace())
 
     # A simple string message
     sent = xbee.SendStr("Hello World")
     sleep(0.25)
     Msg = xbee.Receive()
     if Msg:
-        content = Msg[7:-1].decode('ascii')
+        content = Msg.payload.tobytes().decode('ascii')
         print("Msg: " + content)
 
     # A message that requires escaping
@@ -17,5 +22,5 @@ if __name__ == "__main__":
     sleep(0.25)
     Msg = xbee.Receive()
     if Msg:
-        content = Msg[7:-1]
+        content = Msg.payload
         print("Msg: " + xbee.format(content))
@@ -0,0 +1,30 @@
+import asyncio
+import logging
+import XBee_Async
+import XBee_Trace
+
+
+async def main():
+    # Print every frame sent and received
+    logging.basicConfig(level=logging.DEBUG, format="%(message)s")
+    xbee = XBee_Async.XBee("/dev/ttyUSB0",  # Your serial port name here
+                           trace=XBee_Trace.LogTrace())
+
+    # A simple string message
+    await xbee.SendStr("Hello World")
+    Msg = await xbee.Receive(wait=5)
+    if Msg:
+        content = Msg.payload.tobytes().decode('ascii')
+        print("Msg: " + content)
+
+    # A message that requires escaping
+    await xbee.Send(bytearray.fromhex("7e 7d 11 13 5b 01 01 01 01 01 01 01"))
+    Msg = await xbee.Receive(wait=5)
+    if Msg:
+        content = Msg.payload
+        print("Msg: " + xbee.format(content))
+
+    xbee.shutdown()
+
+if __name__ == "__main__":
+    asyncio.run(main())
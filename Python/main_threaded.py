@@ -1,21 +1,26 @@
+import logging
 import XBee_Threaded
+import XBee_Trace
 from time import sleep
 
 if __name__ == "__main__":
-    xbee = XBee_Threaded.XBee("COM3")  # Your serial port name here
+    # Print every frame sent and received
+    logging.basicConfig(level=logging.DEBUG, format="%(message)s")
+    xbee = XBee_Threaded.XBee("COM3",  # Your serial port name here
+                              trace=XBee_Trace.LogTrace())
 
     # A simple string message
     sent = xbee.SendStr("Hello World")
     Msg = xbee.Receive()
     if Msg:
-        content = Msg[7:-1].decode('ascii')
+        content = Msg.payload.tobytes().decode('ascii')
         print("Msg: " + content)
 
     # A message that requires escaping
     xbee.Send(bytearray.fromhex("7e 7d 11 13 5b 01 01 01 01 01 01 01"))
     Msg = xbee.Receive()
     if Msg:
-        content = Msg[7:-1]
+        content = Msg.payload
         print("Msg: " + xbee.format(content))
 
     xbee.shutdown()